@@ -8,6 +8,7 @@ import math
 import time
 import types
 from datetime import datetime
+from pathlib import Path
 from typing import TYPE_CHECKING, cast
 
 import aiohttp
@@ -25,6 +26,14 @@ from rich.table import Table
 
 from ballsdex.core.commands import Core
 from ballsdex.core.dev import Dev
+from ballsdex.core.image_generator.assets import asset_store
+from ballsdex.core.image_generator.cache import card_cache
+from ballsdex.core.image_generator.image_gen import (
+    SOURCES_PATH,
+    configure_base_layers,
+    invalidate_base_layers,
+)
+from ballsdex.core.image_generator.renderer import CardRenderer
 from ballsdex.core.metrics import PrometheusServer
 from ballsdex.core.models import (
     Ball,
@@ -34,10 +43,14 @@ from ballsdex.core.models import (
     Regime,
     Special,
     balls,
+    bump_cache_generation,
     economies,
     regimes,
     specials,
 )
+from ballsdex.core.utils.catch_names import get_catch_name_index
+from ballsdex.core.utils.guild_config import guild_configs
+from ballsdex.core.utils.user_cache import user_cache
 from ballsdex.settings import settings
 
 if TYPE_CHECKING:
@@ -155,6 +168,17 @@ class BallsDexBot(commands.AutoShardedBot):
         self.command_log: set[int] = set()
         self.locked_balls = TTLCache(maxsize=99999, ttl=60 * 30)
 
+        card_cache.configure(
+            settings.card_cache_size * 1024 * 1024,
+            Path(settings.card_cache_directory) if settings.card_cache_directory else None,
+            settings.card_disk_cache_size * 1024 * 1024,
+        )
+        configure_base_layers(settings.card_layer_cache_size)
+        asset_store.configure(settings.asset_cache_size * 1024 * 1024)
+        self.card_renderer = CardRenderer.from_settings(settings)
+        guild_configs.configure(settings.guild_config_ttl)
+        user_cache.configure(self)
+
         self.owner_ids: set
 
     async def start_prometheus_server(self):
@@ -211,6 +235,26 @@ class BallsDexBot(commands.AutoShardedBot):
         for special in await Special.all():
             specials[special.pk] = special
         table.add_row("Special events", str(len(specials)))
+        bump_cache_generation()
+        table.add_row("Catch names", str(len(get_catch_name_index())))
+
+        # models may have been edited from the admin panel, the card layers must be redrawn
+        # (worker processes compare the drawn fields before reusing their own layers)
+        invalidate_base_layers()
+
+        # images shared by many cards are decoded in advance by the processes drawing cards,
+        # wild cards are kept in memory for spawns
+        backgrounds = [str(SOURCES_PATH / "shiny.png")]
+        backgrounds.extend("." + x.background for x in regimes.values())
+        backgrounds.extend("." + x.background for x in specials.values() if x.background)
+        backgrounds.extend("." + x.icon for x in economies.values())
+        self.card_renderer.prewarm = backgrounds
+        loaded = await asyncio.to_thread(
+            asset_store.prewarm,
+            raw=["." + x.wild_card for x in balls.values() if x.enabled],
+            images=backgrounds if self.card_renderer.workers == 0 else (),
+        )
+        table.add_row("Preloaded images", str(loaded))
 
         self.blacklist = set()
         for blacklisted_id in await BlacklistedID.all().only("discord_id"):
@@ -222,10 +266,19 @@ class BallsDexBot(commands.AutoShardedBot):
             self.blacklist_guild.add(blacklisted_id.discord_id)
         table.add_row("Blacklisted guilds", str(len(self.blacklist_guild)))
 
+        table.add_row("Guild configs", str(await guild_configs.load()))
+
         log.info("Cache loaded, summary displayed below")
         console = Console()
         console.print(table)
 
+    async def on_ballsdex_settings_change(self, guild: discord.Guild, **kwargs):
+        await guild_configs.refresh(guild.id)
+
+    async def close(self) -> None:
+        self.card_renderer.shutdown()
+        await super().close()
+
     async def gateway_healthy(self) -> bool:
         """Check whether or not the gateway proxy is ready and healthy."""
         if settings.gateway_url is None:
@@ -282,6 +335,7 @@ class BallsDexBot(commands.AutoShardedBot):
             )
 
         await self.load_cache()
+        self.card_renderer.start()
         if self.blacklist:
             log.info(f"{len(self.blacklist)} blacklisted users.")
 
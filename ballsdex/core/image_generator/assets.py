@@ -0,0 +1,168 @@
+import logging
+import os
+import threading
+from io import BytesIO
+from typing import Iterable, Literal
+
+from cachetools import LRUCache
+from PIL import Image
+
+log = logging.getLogger("ballsdex.core.image_generator.assets")
+
+AssetKind = Literal["raw", "image"]
+# modification time of the file and its content
+Entry = tuple[int, bytes | Image.Image]
+
+
+def _sizeof(value: Entry) -> int:
+    data = value[1]
+    if isinstance(data, Image.Image):
+        return data.width * data.height * len(data.getbands())
+    return len(data)
+
+
+class AssetStore:
+    """
+    Cache of the image files used by the bot: raw bytes of the files uploaded to Discord (like
+    the wild cards) and decoded images composited on the cards.
+
+    Entries are indexed by path and invalidated when the modification time of the file
+    changes, so replacing an upload doesn't need a restart. The least recently used entries
+    are evicted once `maxsize` is reached.
+
+    This object is shared between the threads rendering cards, all accesses are guarded by
+    a lock.
+
+    Attributes
+    ----------
+    maxsize: int
+        Maximum memory used by the store in bytes, decoded images counting for their size in
+        memory. `0` disables caching, files are then read on every access.
+    hits: int
+        Number of accesses served from memory.
+    misses: int
+        Number of accesses that required reading the file.
+    """
+
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: LRUCache[tuple[AssetKind, str], Entry] | None = None
+        self.configure(maxsize)
+
+    @property
+    def currsize(self) -> int:
+        return int(self._entries.currsize) if self._entries is not None else 0
+
+    def configure(self, maxsize: int):
+        """
+        Change the memory cap of the store. Existing entries are dropped.
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            self._entries = LRUCache(maxsize, getsizeof=_sizeof) if maxsize > 0 else None
+
+    def _load(self, kind: AssetKind, path: str) -> bytes | Image.Image:
+        if kind == "raw":
+            with open(path, "rb") as file:
+                return file.read()
+        with Image.open(path) as image:
+            return image.convert("RGBA")
+
+    def _get(self, kind: AssetKind, path: str) -> bytes | Image.Image:
+        mtime = os.stat(path).st_mtime_ns
+        key = (kind, path)
+        with self._lock:
+            if self._entries is not None:
+                cached = self._entries.get(key)
+                if cached is not None and cached[0] == mtime:
+                    self.hits += 1
+                    return cached[1]
+            self.misses += 1
+        data = self._load(kind, path)
+        with self._lock:
+            if self._entries is not None and _sizeof((mtime, data)) <= self.maxsize:
+                self._entries[key] = (mtime, data)
+        return data
+
+    def read(self, path: str) -> bytes:
+        """
+        Return the content of a file.
+
+        Parameters
+        ----------
+        path: str
+            Path of the file, relative to the working directory.
+
+        Returns
+        -------
+        bytes
+            The raw content of the file.
+        """
+        return self._get("raw", path)  # type: ignore
+
+    def open(self, path: str) -> BytesIO:
+        """
+        Return a new file object reading the cached content of a file, for uploads.
+        The bytes are shared with the cache and not copied.
+        """
+        return BytesIO(self.read(path))
+
+    def get_image(self, path: str) -> Image.Image:
+        """
+        Return an image decoded in RGBA mode.
+
+        The returned image is shared and must not be modified, copy it first.
+
+        Parameters
+        ----------
+        path: str
+            Path of the image, relative to the working directory.
+        """
+        return self._get("image", path)  # type: ignore
+
+    def prewarm(self, raw: Iterable[str] = (), images: Iterable[str] = ()) -> int:
+        """
+        Load files in advance, stopping once the store is full. Files that can't be read are
+        logged and skipped.
+
+        Parameters
+        ----------
+        raw: Iterable[str]
+            Paths of the files to keep as raw bytes.
+        images: Iterable[str]
+            Paths of the images to keep decoded.
+
+        Returns
+        -------
+        int
+            The number of files loaded.
+        """
+        if self._entries is None:
+            return 0
+        loaded = 0
+        for kind, paths in (("image", images), ("raw", raw)):
+            for path in dict.fromkeys(paths):
+                if self.currsize >= self.maxsize:
+                    log.debug(f"Asset store full after prewarming {loaded} files")
+                    return loaded
+                try:
+                    self._get(kind, path)  # type: ignore
+                except (OSError, Image.UnidentifiedImageError):
+                    log.warning(f"Failed to prewarm asset {path}", exc_info=True)
+                else:
+                    loaded += 1
+        return loaded
+
+    def clear(self):
+        """
+        Drop all the entries.
+        """
+        with self._lock:
+            if self._entries is not None:
+                self._entries.clear()
+
+
+asset_store = AssetStore()
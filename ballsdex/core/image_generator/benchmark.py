@@ -0,0 +1,255 @@
+"""
+Benchmark the card renderer without a database or a Discord connection.
+
+In-memory balls and instances are built from the images shipped in the `src` folder (and the
+uploads in `static` if any), then drawn and encoded through the same path as the bot. Latency
+percentiles, peak memory and output size are reported for each card variant and output profile.
+
+Run with `python -m ballsdex.core.image_generator.benchmark --help`.
+"""
+
+import argparse
+import itertools
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from tortoise import Tortoise
+
+from ballsdex.core.image_generator.assets import asset_store
+from ballsdex.core.image_generator.formats import DEFAULT_PROFILES, CardProfile, card_filename
+from ballsdex.core.image_generator.image_gen import SOURCES_PATH, CardSpec, invalidate_base_layers
+from ballsdex.core.image_generator.renderer import encode_card
+
+if TYPE_CHECKING:
+    from ballsdex.core.models import BallInstance
+
+VARIANTS = ("regular", "shiny", "special", "long")
+LONG_DESCRIPTION = (
+    "Every time this ball enters the battlefield, it summons a parade of its ancestors, "
+    "each of them dealing a small amount of damage to every enemy ball, then heals all of "
+    "its allies for a fraction of the damage dealt, unless it is raining outside."
+)
+
+
+def _media_path(path: Path) -> str:
+    # paths are stored like uploads, relative to the working directory without the leading dot
+    return "/" + os.path.relpath(path)
+
+
+@dataclass
+class BenchmarkResult:
+    variant: str
+    profile: CardProfile
+    timings: list[float]
+    sizes: list[int]
+    peak_rss: int
+    # formats actually produced, a profile can fall back to another one for some cards
+    formats: set[str]
+
+    @property
+    def p50(self) -> float:
+        return statistics.median(self.timings)
+
+    @property
+    def p99(self) -> float:
+        if len(self.timings) < 2:
+            return self.timings[0]
+        return statistics.quantiles(self.timings, n=100, method="inclusive")[98]
+
+
+def build_fixtures(count: int, seed: int = 0) -> dict[str, list["BallInstance"]]:
+    """
+    Create in-memory instances for each card variant, without touching the database.
+
+    The objects are also registered in the caches of `ballsdex.core.models`, like the bot does
+    on startup.
+
+    Parameters
+    ----------
+    count: int
+        Number of instances per variant. Bonuses are randomized so that the cards differ.
+    seed: int
+        Seed used for the bonuses, for reproducible runs.
+
+    Returns
+    -------
+    dict[str, list[BallInstance]]
+        The instances, indexed by variant name.
+    """
+    Tortoise.init_models(["ballsdex.core.models"], "models")
+    from ballsdex.core import models
+
+    artworks = [SOURCES_PATH / "fr_test.png"]
+    artworks.extend(sorted(Path("static").glob("**/*.png")))
+    backgrounds = ["democracy.png", "dictatorship.png", "union.png"]
+    icons = ["capitalist.png", "communist.png"]
+
+    for i, name in enumerate(backgrounds, start=1):
+        regime = models.Regime(id=i, name=name, background=_media_path(SOURCES_PATH / name))
+        regime._saved_in_db = True
+        models.regimes[i] = regime
+    for i, name in enumerate(icons, start=1):
+        economy = models.Economy(id=i, name=name, icon=_media_path(SOURCES_PATH / name))
+        economy._saved_in_db = True
+        models.economies[i] = economy
+    now = datetime.now()
+    special = models.Special(
+        id=1,
+        name="Benchmark",
+        start_date=now,
+        end_date=now + timedelta(days=1),
+        rarity=1,
+        background=_media_path(SOURCES_PATH / "dictatorship.png"),
+    )
+    special._saved_in_db = True
+    models.specials[1] = special
+
+    def make_ball(pk: int, regime_id: int, long: bool = False) -> "models.Ball":
+        regime = models.regimes[regime_id]
+        economy = models.economies[pk % len(icons) + 1]
+        ball = models.Ball(
+            id=pk,
+            country="Kingdom of Great Britain and Northern Ireland" if long else f"Ball {pk}",
+            regime=regime,
+            regime_id=regime.pk,
+            economy=economy,
+            economy_id=economy.pk,
+            health=1500,
+            attack=900,
+            rarity=1,
+            emoji_id=100000000000000000 + pk,
+            wild_card=_media_path(artworks[pk % len(artworks)]),
+            collection_card=_media_path(artworks[pk % len(artworks)]),
+            credits="Benchmark",
+            capacity_name="Parade of the ancestors" if long else "Baguette Barrage",
+            capacity_description=LONG_DESCRIPTION if long else "Throws bread at the enemy.",
+        )
+        ball._saved_in_db = True
+        models.balls[pk] = ball
+        return ball
+
+    regular = [make_ball(i, i) for i in range(1, len(backgrounds) + 1)]
+    long_ball = make_ball(len(regular) + 1, 2, long=True)
+
+    rng = random.Random(seed)
+    ids = itertools.count(1)
+    fixtures: dict[str, list["BallInstance"]] = {variant: [] for variant in VARIANTS}
+    for i in range(count):
+        for variant in VARIANTS:
+            ball = long_ball if variant == "long" else regular[i % len(regular)]
+            special_id = special.pk if variant == "special" else None
+            instance = models.BallInstance(
+                id=next(ids),
+                ball=ball,
+                ball_id=ball.pk,
+                special=models.specials.get(special_id),  # type: ignore
+                special_id=special_id,
+                shiny=variant == "shiny",
+                attack_bonus=rng.randint(-20, 20),
+                health_bonus=rng.randint(-20, 20),
+            )
+            fixtures[variant].append(instance)
+    return fixtures
+
+
+def peak_rss() -> int:
+    """
+    Return the peak resident memory of this process in bytes.
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def benchmark(
+    variant: str, instances: list["BallInstance"], profile: CardProfile, cold: bool = False
+) -> BenchmarkResult:
+    """
+    Draw and encode every instance with the given profile, like `BallInstance.draw_card`
+    without the rendered cards cache.
+
+    Parameters
+    ----------
+    variant: str
+        Name of the variant, for the report.
+    instances: list[BallInstance]
+        Instances to draw.
+    profile: CardProfile
+        Output profile.
+    cold: bool
+        Drop the static card layers before each card, to measure rendering from scratch.
+    """
+    timings: list[float] = []
+    sizes: list[int] = []
+    formats: set[str] = set()
+    for instance in instances:
+        if cold:
+            invalidate_base_layers()
+        start = time.perf_counter()
+        data = encode_card(CardSpec.from_instance(instance), profile)
+        timings.append((time.perf_counter() - start) * 1000)
+        sizes.append(len(data))
+        formats.add(card_filename(data).rsplit(".", 1)[-1])
+    return BenchmarkResult(variant, profile, timings, sizes, peak_rss(), formats)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--count", "-n", type=int, default=20, help="Cards per variant")
+    parser.add_argument(
+        "--variant",
+        "-v",
+        action="append",
+        choices=VARIANTS,
+        help="Card variants to draw, all by default. Can be repeated.",
+    )
+    parser.add_argument(
+        "--profile",
+        "-p",
+        action="append",
+        choices=list(DEFAULT_PROFILES),
+        help="Output profiles to benchmark, all by default. Can be repeated.",
+    )
+    parser.add_argument("--cold", action="store_true", help="Disable the static card layers cache")
+    parser.add_argument(
+        "--assets",
+        type=int,
+        default=128,
+        metavar="MB",
+        help="Memory size of the decoded source images cache, 0 to disable",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random stats")
+    args = parser.parse_args()
+    asset_store.configure(args.assets * 1024 * 1024)
+
+    fixtures = build_fixtures(args.count, args.seed)
+    variants = args.variant or VARIANTS
+    profiles = [DEFAULT_PROFILES[name] for name in args.profile or DEFAULT_PROFILES]
+
+    print(
+        f"{'variant':<10}{'profile':<10}{'format':<10}{'p50 ms':>9}{'p99 ms':>9}"
+        f"{'avg bytes':>12}{'peak RSS MB':>13}"
+    )
+    for variant in variants:
+        for profile in profiles:
+            result = benchmark(variant, fixtures[variant], profile, args.cold)
+            print(
+                f"{variant:<10}{profile.name:<10}{'/'.join(sorted(result.formats)):<10}"
+                f"{result.p50:>9.1f}{result.p99:>9.1f}"
+                f"{statistics.mean(result.sizes):>12.0f}"
+                f"{result.peak_rss / 1024 / 1024:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
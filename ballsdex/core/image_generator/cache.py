@@ -0,0 +1,207 @@
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from cachetools import LRUCache
+from prometheus_client import REGISTRY, Counter
+
+if TYPE_CHECKING:
+    from ballsdex.core.image_generator.formats import CardProfile
+    from ballsdex.core.image_generator.image_gen import CardSpec
+
+log = logging.getLogger("ballsdex.core.image_generator.cache")
+
+# the module can be reloaded, the metrics must only be registered once
+if "card_cache_lookups" not in REGISTRY._names_to_collectors:
+    card_cache_lookups = Counter(
+        "card_cache_lookups", "Lookups of the rendered cards cache", ["result"]
+    )
+else:
+    card_cache_lookups = REGISTRY._names_to_collectors["card_cache_lookups"]
+
+
+def card_cache_key(spec: "CardSpec", profile: "CardProfile | None" = None) -> str:
+    """
+    Build a content-addressed key for a card.
+
+    Only the inputs that change the rendered image are part of the key, meaning two instances
+    of the same ball with identical stats share the same card. Editing the ball changes its
+    drawn fields, and therefore the key, without requiring explicit invalidation.
+
+    Parameters
+    ----------
+    spec: CardSpec
+        The inputs of the card being drawn.
+    profile: CardProfile | None
+        The output profile of the card. The same card encoded with different profiles is
+        cached separately.
+
+    Returns
+    -------
+    str
+        A hexadecimal digest identifying the rendered image.
+    """
+    return hashlib.sha1(repr((spec, profile)).encode()).hexdigest()
+
+
+class CardCache:
+    """
+    Cache of rendered cards, with an in-memory LRU tier and an optional on-disk tier.
+
+    The disk tier is also bounded: the least recently used files are deleted once the files
+    exceed `disk_maxsize`. The modification time of a file is updated when it is read, so the
+    order survives restarts.
+
+    This object is shared between the threads rendering cards, all accesses are guarded by
+    a lock.
+
+    Attributes
+    ----------
+    maxsize: int
+        Maximum size in bytes of the in-memory tier. `0` disables the memory tier.
+    directory: Path | None
+        Directory where rendered cards are also written. `None` disables the disk tier.
+    disk_maxsize: int
+        Maximum size in bytes of the files of the disk tier. `0` means no limit.
+    hits: int
+        Number of lookups that were served from either tier.
+    misses: int
+        Number of lookups that required rendering the card.
+    """
+
+    def __init__(self, maxsize: int = 0, directory: Path | None = None, disk_maxsize: int = 0):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.disk_maxsize = disk_maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory: LRUCache[str, bytes] | None = None
+        # size of the files on disk, from the least to the most recently used
+        self._disk: dict[str, int] = {}
+        self._disk_size = 0
+        self.configure(maxsize, directory, disk_maxsize)
+
+    @property
+    def enabled(self) -> bool:
+        return self._memory is not None or self.directory is not None
+
+    def configure(self, maxsize: int, directory: Path | None = None, disk_maxsize: int = 0):
+        """
+        Resize the cache and change the disk directory. Existing in-memory entries are dropped,
+        the files already in the directory are kept within `disk_maxsize`.
+        """
+        disk: dict[str, int] = {}
+        if directory is not None:
+            directory.mkdir(parents=True, exist_ok=True)
+            files = []
+            for entry in os.scandir(directory):
+                if entry.name.endswith(".tmp") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+            disk = {name: size for _, name, size in sorted(files)}
+        with self._lock:
+            self.maxsize = maxsize
+            self._memory = LRUCache(maxsize, getsizeof=len) if maxsize > 0 else None
+            self.directory = directory
+            self.disk_maxsize = disk_maxsize
+            self._disk = disk
+            self._disk_size = sum(disk.values())
+            evicted = self._evict_disk()
+        self._remove_files(evicted)
+
+    def _disk_path(self, key: str) -> Path:
+        assert self.directory
+        return self.directory / key
+
+    def get(self, key: str) -> bytes | None:
+        """
+        Return the cached card for this key, or `None` if it must be rendered.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._memory is not None and (data := self._memory.get(key)) is not None:
+                self.hits += 1
+                card_cache_lookups.labels(result="hit").inc()
+                return data
+        if self.directory is not None:
+            path = self._disk_path(key)
+            try:
+                data = path.read_bytes()
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                log.warning(f"Failed to read card {key} from disk cache", exc_info=True)
+            else:
+                with self._lock:
+                    self.hits += 1
+                    self._disk_size += len(data) - self._disk.pop(key, 0)
+                    self._disk[key] = len(data)
+                    self._store_memory(key, data)
+                card_cache_lookups.labels(result="hit").inc()
+                return data
+        with self._lock:
+            self.misses += 1
+        card_cache_lookups.labels(result="miss").inc()
+        return None
+
+    def set(self, key: str, data: bytes):
+        """
+        Store a rendered card in all the enabled tiers.
+        """
+        with self._lock:
+            self._store_memory(key, data)
+        if self.directory is not None:
+            path = self._disk_path(key)
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            try:
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+            except OSError:
+                log.warning(f"Failed to write card {key} to disk cache", exc_info=True)
+                return
+            with self._lock:
+                self._disk_size += len(data) - self._disk.pop(key, 0)
+                self._disk[key] = len(data)
+                evicted = self._evict_disk()
+            self._remove_files(evicted)
+
+    def _store_memory(self, key: str, data: bytes):
+        if self._memory is None or len(data) > self.maxsize:
+            return
+        self._memory[key] = data
+
+    def _evict_disk(self) -> list[str]:
+        # must be called with the lock held, the files are removed by the caller without it
+        evicted: list[str] = []
+        if self.disk_maxsize <= 0:
+            return evicted
+        while self._disk_size > self.disk_maxsize and self._disk:
+            key = next(iter(self._disk))
+            self._disk_size -= self._disk.pop(key)
+            evicted.append(key)
+        return evicted
+
+    def _remove_files(self, keys: list[str]):
+        for key in keys:
+            try:
+                self._disk_path(key).unlink(missing_ok=True)
+            except OSError:
+                log.warning(f"Failed to remove card {key} from disk cache", exc_info=True)
+
+    def clear(self):
+        """
+        Drop the in-memory tier. Files on disk are kept.
+        """
+        with self._lock:
+            if self._memory is not None:
+                self._memory.clear()
+
+
+card_cache = CardCache()
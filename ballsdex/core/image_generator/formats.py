@@ -0,0 +1,139 @@
+from dataclasses import dataclass, replace
+from io import BytesIO
+from typing import Any, Literal
+
+from PIL import Image
+
+__all__ = ("CardProfile", "DEFAULT_PROFILES", "encode_image", "card_filename", "load_profiles")
+
+# lowest quality the size budget is allowed to reach for lossy formats
+MIN_QUALITY = 40
+
+
+@dataclass(frozen=True, slots=True)
+class CardProfile:
+    """
+    Describes how a rendered card is encoded before being uploaded.
+
+    Attributes
+    ----------
+    name: str
+        Name of the profile, used in the configuration file.
+    format: Literal["png", "webp", "jpeg"]
+        Output format. JPEG is only used for cards without transparency, other cards fall back
+        to lossy WebP with the same quality.
+    quality: int
+        Quality of lossy encoders, between 1 and 100.
+    lossless: bool
+        Use lossless compression for WebP.
+    scale: float
+        Factor applied to the card size, below 1 for downscaled previews.
+    effort: int
+        Encoder speed/size trade-off: PNG compression level (0-9) or WebP method (0-6).
+        Higher values are slower and produce smaller files. Ignored for JPEG.
+    max_bytes: int | None
+        Size budget. Lossy encodings are retried with a lower quality until the output fits.
+    """
+
+    name: str
+    format: Literal["png", "webp", "jpeg"] = "png"
+    quality: int = 90
+    lossless: bool = False
+    scale: float = 1.0
+    effort: int = 6
+    max_bytes: int | None = None
+
+
+DEFAULT_PROFILES: dict[str, CardProfile] = {
+    # lossless, kept for the detailed views like /balls info
+    "full": CardProfile("full", "png", effort=6),
+    "webp": CardProfile("webp", "webp", quality=90, effort=2),
+    "jpeg": CardProfile("jpeg", "jpeg", quality=92),
+    # cheap profile for list views and previews
+    "preview": CardProfile(
+        "preview", "webp", quality=80, scale=0.5, effort=2, max_bytes=150 * 1024
+    ),
+}
+
+
+def load_profiles(overrides: dict[str, dict[str, Any]] | None) -> dict[str, CardProfile]:
+    """
+    Merge the profiles defined in the configuration file with the default ones.
+
+    Keys of each profile match the attributes of `CardProfile`, with dashes instead of
+    underscores. Partially defined default profiles keep their other values.
+    """
+    profiles = DEFAULT_PROFILES.copy()
+    for name, options in (overrides or {}).items():
+        options = {key.replace("-", "_"): value for key, value in (options or {}).items()}
+        if name in profiles:
+            profiles[name] = replace(profiles[name], **options)
+        else:
+            profiles[name] = CardProfile(name, **options)
+    return profiles
+
+
+def _has_transparency(image: Image.Image) -> bool:
+    if image.mode != "RGBA":
+        return False
+    return image.getchannel("A").getextrema()[0] < 255
+
+
+def _save(image: Image.Image, profile: CardProfile, quality: int) -> bytes:
+    buffer = BytesIO()
+    if profile.format == "png":
+        image.save(buffer, format="png", compress_level=profile.effort)
+    elif profile.format == "webp":
+        image.save(
+            buffer,
+            format="webp",
+            lossless=profile.lossless,
+            quality=quality,
+            method=profile.effort,
+        )
+    else:
+        image.convert("RGB").save(buffer, format="jpeg", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def encode_image(image: Image.Image, profile: CardProfile) -> bytes:
+    """
+    Encode a card following the given profile.
+
+    Parameters
+    ----------
+    image: Image.Image
+        The rendered card. It is not modified.
+    profile: CardProfile
+        The profile to follow.
+
+    Returns
+    -------
+    bytes
+        The encoded image.
+    """
+    if profile.scale != 1:
+        size = (round(image.width * profile.scale), round(image.height * profile.scale))
+        image = image.resize(size, Image.Resampling.LANCZOS)
+    if profile.format == "jpeg" and _has_transparency(image):
+        profile = replace(profile, format="webp", lossless=False, effort=2)
+
+    quality = profile.quality
+    data = _save(image, profile, quality)
+    lossy = profile.format == "jpeg" or (profile.format == "webp" and not profile.lossless)
+    while lossy and profile.max_bytes and len(data) > profile.max_bytes and quality > MIN_QUALITY:
+        quality = max(MIN_QUALITY, quality - 10)
+        data = _save(image, profile, quality)
+    return data
+
+
+def card_filename(data: bytes) -> str:
+    """
+    Return the file name to upload an encoded card with. The extension is read from the data
+    since the output format of a profile may change depending on the card.
+    """
+    if data.startswith(b"\x89PNG"):
+        return "card.png"
+    if data[8:12] == b"WEBP":
+        return "card.webp"
+    return "card.jpg"
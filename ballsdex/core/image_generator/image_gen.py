@@ -1,9 +1,15 @@
+import functools
 import os
 import textwrap
+import threading
+from dataclasses import dataclass
 from pathlib import Path
 from typing import TYPE_CHECKING
+from cachetools import LRUCache
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 
+from ballsdex.core.image_generator.assets import asset_store
+
 if TYPE_CHECKING:
     from ballsdex.core.models import BallInstance
 
@@ -20,56 +26,161 @@ capacity_name_font = ImageFont.truetype(str(SOURCES_PATH / "Hobeaux-Bold.ttf"),
 capacity_description_font = ImageFont.truetype(str(SOURCES_PATH / "CooperFiveOpti-Black.ttf"), 75)
 stats_font = ImageFont.truetype(str(SOURCES_PATH / "Hobeaux-Bold.ttf"), 130)
 credits_font = ImageFont.truetype(str(SOURCES_PATH / "OpenSans-Semibold.ttf"), 40)
+_dummy_draw = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+
+# static part of the cards per (ball ID, background), only the stats are drawn per instance
+# values are (fingerprint of the drawn ball fields, image)
+base_layers: LRUCache[tuple[int | None, str], tuple[tuple, Image.Image]] = LRUCache(16)
+_base_layers_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=64)
+def get_font(font_path: str, size: int) -> ImageFont.FreeTypeFont:
+    """
+    Load a font once per path and size, FreeType objects are then reused for every card.
+    """
+    return ImageFont.truetype(font_path, size)
 
-def get_scaled_font_size(text: str, max_width: int, max_height: int, font_path: str, starting_size: int, min_size: int = 40) -> tuple[int, list[str]]:
-    font_size = starting_size
-    font = ImageFont.truetype(str(font_path), font_size)
-    dummy_draw = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+
+@functools.lru_cache(maxsize=2048)
+def get_scaled_font_size(
+    text: str,
+    max_width: int,
+    max_height: int,
+    font_path: str | Path,
+    starting_size: int,
+    min_size: int = 40,
+) -> tuple[int, tuple[str, ...]]:
+    """
+    Find the biggest font size, by steps of 2 from `starting_size`, for which the wrapped text
+    fits in the given box. The result is memoized, the same abilities are laid out on every
+    card of a ball.
+    """
     wrapped_text = textwrap.wrap(text, width=28)
-    
+
     if len(wrapped_text) >= 4:
         font_size = max(min_size, starting_size - (10 * (len(wrapped_text) - 4)))
-        font = ImageFont.truetype(str(font_path), font_size)
         wrapped_text = textwrap.wrap(text, width=25)
-        while len(wrapped_text) > 7:
-            font_size -= 2
-            if font_size < min_size:
-                font_size = min_size
-                break
-            font = ImageFont.truetype(str(font_path), font_size)
-            wrapped_text = textwrap.wrap(text, width=25)
-    else:
-        text_height = len(wrapped_text) * font_size * 1.1
-        while text_height > max_height or any(dummy_draw.textlength(line, font=font) > max_width for line in wrapped_text):
-            font_size -= 2
-            if font_size < min_size:
-                font_size = min_size
-                break
-            font = ImageFont.truetype(str(font_path), font_size)
-            wrapped_text = textwrap.wrap(text, width=28)
-            text_height = len(wrapped_text) * font_size * 1.1
-    
-    return font_size, wrapped_text
+        if len(wrapped_text) > 7:
+            # wrapping doesn't depend on the font size, shrinking can only reach the minimum
+            font_size = min_size
+        return font_size, tuple(wrapped_text)
 
-def draw_card(ball_instance: "BallInstance"):
-    ball = ball_instance.countryball
-    ball_health = (237, 115, 101, 255)
-
-    if ball_instance.shiny:
-        image = Image.open(str(SOURCES_PATH / "shiny.png"))
-        ball_health = (255, 255, 255, 255)
-    elif special_image := ball_instance.special_card:
-        image = Image.open("." + special_image)
-    else:
-        image = Image.open("." + ball.cached_regime.background)
-    
-    image = image.convert("RGBA")
-    icon = Image.open("." + ball.cached_economy.icon).convert("RGBA") if ball.cached_economy else None
+    def fits(font_size: int) -> bool:
+        if len(wrapped_text) * font_size * 1.1 > max_height:
+            return False
+        font = get_font(str(font_path), font_size)
+        return all(_dummy_draw.textlength(line, font=font) <= max_width for line in wrapped_text)
+
+    if fits(starting_size):
+        return starting_size, tuple(wrapped_text)
+
+    # binary search of the smallest step (so the biggest size) that fits
+    low, high = 1, (starting_size - min_size) // 2
+    font_size = min_size
+    while low <= high:
+        step = (low + high) // 2
+        if fits(starting_size - 2 * step):
+            font_size = starting_size - 2 * step
+            high = step - 1
+        else:
+            low = step + 1
+    return font_size, tuple(wrapped_text)
+
+
+@dataclass(frozen=True, slots=True)
+class CardSpec:
+    """
+    All the inputs needed to draw a card, detached from the database models.
+
+    This object can be sent to other processes and is used as the key for caching cards.
+    """
+
+    ball_id: int | None
+    background: str
+    title: str
+    capacity_name: str
+    capacity_description: str
+    credits: str
+    artwork: str
+    icon: str | None
+    shiny: bool
+    health: int
+    attack: int
+
+    @classmethod
+    def from_instance(cls, ball_instance: "BallInstance") -> "CardSpec":
+        ball = ball_instance.countryball
+        economy = ball.cached_economy
+        if ball_instance.shiny:
+            background = str(SOURCES_PATH / "shiny.png")
+        elif special_image := ball_instance.special_card:
+            background = "." + special_image
+        else:
+            background = "." + ball.cached_regime.background
+        return cls(
+            ball_id=ball.pk,
+            background=background,
+            title=ball.short_name or ball.country,
+            capacity_name=ball.capacity_name,
+            capacity_description=ball.capacity_description,
+            credits=ball.credits,
+            artwork="." + ball.collection_card,
+            icon="." + economy.icon if economy else None,
+            shiny=ball_instance.shiny,
+            health=ball_instance.health,
+            attack=ball_instance.attack,
+        )
+
+    @property
+    def base_key(self) -> tuple[int | None, str]:
+        return (self.ball_id, self.background)
+
+    @property
+    def base_fingerprint(self) -> tuple:
+        return (
+            self.title,
+            self.capacity_name,
+            self.capacity_description,
+            self.credits,
+            self.artwork,
+            self.icon,
+        )
+
+
+def configure_base_layers(maxsize: int):
+    """
+    Change the number of base layers kept in memory. Existing layers are dropped.
+    """
+    global base_layers
+    with _base_layers_lock:
+        base_layers = LRUCache(maxsize)
+
+
+def invalidate_base_layers(ball_id: int | None = None):
+    """
+    Drop the cached base layers of a ball, or of all balls if `ball_id` is `None`.
+    """
+    with _base_layers_lock:
+        if ball_id is None:
+            base_layers.clear()
+            return
+        for key in [x for x in base_layers if x[0] == ball_id]:
+            del base_layers[key]
+
+
+def draw_base_layer(spec: CardSpec) -> Image.Image:
+    """
+    Draw everything on a card that doesn't depend on the instance: title, ability, credits,
+    artwork and economy icon. Only the stats are missing from the returned image.
+    """
+    image = asset_store.get_image(spec.background).copy()
+    icon = asset_store.get_image(spec.icon) if spec.icon else None
 
     draw = ImageDraw.Draw(image)
-    draw.text((50, 20), ball.short_name or ball.country, font=title_font)
+    draw.text((50, 20), spec.title, font=title_font)
 
-    ability_text = f"Ability: {ball.capacity_name}"
+    ability_text = f"Ability: {spec.capacity_name}"
     ability_font_size, wrapped_ability = get_scaled_font_size(
         ability_text,
         RECTANGLE_WIDTH - 150,
@@ -78,17 +189,17 @@ def draw_card(ball_instance: "BallInstance"):
         110,
         90
     )
-    dynamic_ability_font = ImageFont.truetype(str(SOURCES_PATH / "Hobeaux-Bold.ttf"), ability_font_size)
+    dynamic_ability_font = get_font(str(SOURCES_PATH / "Hobeaux-Bold.ttf"), ability_font_size)
 
     desc_font_size, wrapped_desc = get_scaled_font_size(
-        ball.capacity_description,
+        spec.capacity_description,
         RECTANGLE_WIDTH - 120,
         300,
         SOURCES_PATH / "CooperFiveOpti-Black.ttf",
         75,
         60
     )
-    dynamic_desc_font = ImageFont.truetype(str(SOURCES_PATH / "CooperFiveOpti-Black.ttf"), desc_font_size)
+    dynamic_desc_font = get_font(str(SOURCES_PATH / "CooperFiveOpti-Black.ttf"), desc_font_size)
 
     ability_y = 1050
     line_spacing = 1.05 if len(wrapped_ability) >= 5 else 1.1
@@ -113,9 +224,55 @@ def draw_card(ball_instance: "BallInstance"):
             stroke_fill=(0, 0, 0, 255)
         )
 
+    draw.text(
+        (30, 1847),
+        "FanmadeDex owned by Venus\nBallsDex created by El Laggron\n" + f"Monster owner: {spec.credits}",
+        font=credits_font,
+        fill=(0, 0, 0, 255),
+        stroke_width=0,
+        stroke_fill=(255, 255, 255, 255)
+    )
+
+    artwork = ImageOps.fit(asset_store.get_image(spec.artwork), artwork_size)
+    image.paste(artwork, CORNERS[0])
+    artwork.close()
+
+    if icon:
+        icon = ImageOps.fit(icon, (192, 192))
+        image.paste(icon, (1200, 30), mask=icon)
+        icon.close()
+
+    return image
+
+
+def get_base_layer(spec: CardSpec) -> Image.Image:
+    """
+    Return the base layer for this card, drawing it only once per ball and background.
+
+    The returned image is shared and must not be modified, copy it first.
+    """
+    key = spec.base_key
+    fingerprint = spec.base_fingerprint
+    with _base_layers_lock:
+        cached = base_layers.get(key)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+    image = draw_base_layer(spec)
+    with _base_layers_lock:
+        if base_layers.maxsize > 0:
+            base_layers[key] = (fingerprint, image)
+    return image
+
+
+def draw_stats(image: Image.Image, health: int, attack: int, shiny: bool = False):
+    """
+    Draw the health and attack values on top of a base layer.
+    """
+    ball_health = (255, 255, 255, 255) if shiny else (237, 115, 101, 255)
+    draw = ImageDraw.Draw(image)
     draw.text(
         (320, 1670),
-        str(ball_instance.health),
+        str(health),
         font=stats_font,
         fill=ball_health,
         stroke_width=1,
@@ -124,7 +281,7 @@ def draw_card(ball_instance: "BallInstance"):
 
     draw.text(
         (1120, 1670),
-        str(ball_instance.attack),
+        str(attack),
         font=stats_font,
         fill=(252, 194, 76, 255),
         stroke_width=1,
@@ -132,22 +289,12 @@ def draw_card(ball_instance: "BallInstance"):
         anchor="ra"
     )
 
-    draw.text(
-        (30, 1847),
-        "FanmadeDex owned by Venus\nBallsDex created by El Laggron\n" + f"Monster owner: {ball.credits}",
-        font=credits_font,
-        fill=(0, 0, 0, 255),
-        stroke_width=0,
-        stroke_fill=(255, 255, 255, 255)
-    )
 
-    artwork = Image.open("." + ball.collection_card).convert("RGBA")
-    image.paste(ImageOps.fit(artwork, artwork_size), CORNERS[0])
+def render_card(spec: CardSpec) -> Image.Image:
+    image = get_base_layer(spec).copy()
+    draw_stats(image, spec.health, spec.attack, spec.shiny)
+    return image
 
-    if icon:
-        icon = ImageOps.fit(icon, (192, 192))
-        image.paste(icon, (1200, 30), mask=icon)
-        icon.close()
-    artwork.close()
 
-    return image
+def draw_card(ball_instance: "BallInstance"):
+    return render_card(CardSpec.from_instance(ball_instance))
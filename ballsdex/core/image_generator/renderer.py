@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Iterable, TypeVar
+
+from ballsdex.core.image_generator.assets import asset_store
+from ballsdex.core.image_generator.cache import card_cache, card_cache_key
+from ballsdex.core.image_generator.formats import (
+    DEFAULT_PROFILES,
+    CardProfile,
+    encode_image,
+    load_profiles,
+)
+from ballsdex.core.image_generator.image_gen import CardSpec, configure_base_layers, render_card
+
+if TYPE_CHECKING:
+    from ballsdex.core.models import BallInstance
+    from ballsdex.settings import Settings
+
+log = logging.getLogger("ballsdex.core.image_generator.renderer")
+T = TypeVar("T")
+
+# each worker holds its own image caches, so the pool is kept small unless configured
+DEFAULT_WORKERS = 2
+
+
+def encode_card(spec: CardSpec, profile: CardProfile = DEFAULT_PROFILES["full"]) -> bytes:
+    """
+    Draw a card and return it encoded following the profile. This is the function executed by
+    the workers.
+    """
+    image = render_card(spec)
+    try:
+        return encode_image(image, profile)
+    finally:
+        image.close()
+
+
+def encode_cards(specs: list[CardSpec], profile: CardProfile) -> list[bytes]:
+    """
+    Draw and encode multiple cards in the same worker, sharing their base layer.
+    """
+    return [encode_card(spec, profile) for spec in specs]
+
+
+def _init_worker(layers: int, assets: int, prewarm: list[str]):
+    # fonts are loaded when image_gen is imported, which happens once per worker process
+    # when unpickling this function, instead of on every render
+    configure_base_layers(layers)
+    asset_store.configure(assets)
+    asset_store.prewarm(images=prewarm)
+
+
+class CardRenderer:
+    """
+    Bot-wide service drawing cards in a pool of long-lived processes.
+
+    Drawing with PIL is CPU-bound and holds the GIL, running it in processes lets renders
+    scale across cores. Pending renders are bounded: once `queue_size` cards are waiting,
+    new callers wait for a slot instead of piling work on the pool.
+
+    Attributes
+    ----------
+    workers: int
+        Number of worker processes, `0` renders in a thread of the bot process instead. Each
+        worker keeps its own copy of the layers and assets caches.
+    queue_size: int
+        Maximum number of renders submitted to the pool at the same time.
+    layers: int
+        Number of static card layers each worker keeps in memory.
+    assets: int
+        Maximum size in bytes of the decoded images each worker keeps in memory.
+    prewarm: list[str]
+        Paths of the images decoded by the workers when they start.
+    profiles: dict[str, CardProfile]
+        Available output profiles, indexed by name.
+    default_profile: CardProfile
+        Profile used for detailed card views.
+    preview_profile: CardProfile
+        Cheaper profile used for list views and previews.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        queue_size: int = 64,
+        layers: int = 16,
+        assets: int = 0,
+        *,
+        profiles: dict[str, CardProfile] | None = None,
+        default_profile: str = "full",
+        preview_profile: str = "preview",
+    ):
+        self.workers = DEFAULT_WORKERS if workers is None else workers
+        self.queue_size = queue_size
+        self.layers = layers
+        self.assets = assets
+        self.prewarm: list[str] = []
+        self.profiles = profiles or DEFAULT_PROFILES.copy()
+        self.default_profile = self.get_profile(default_profile)
+        self.preview_profile = self.get_profile(preview_profile)
+        self.pending = 0
+        self._pool: ProcessPoolExecutor | None = None
+        self._slots = asyncio.Semaphore(queue_size)
+
+    @classmethod
+    def from_settings(cls, settings: "Settings") -> "CardRenderer":
+        return cls(
+            settings.render_workers,
+            settings.render_queue_size,
+            settings.card_layer_cache_size,
+            settings.asset_cache_size * 1024 * 1024,
+            profiles=load_profiles(settings.card_profiles),
+            default_profile=settings.card_profile,
+            preview_profile=settings.card_preview_profile,
+        )
+
+    def get_profile(self, name: str) -> CardProfile:
+        """
+        Return the profile with this name, or the full quality profile if it doesn't exist.
+        """
+        try:
+            return self.profiles[name]
+        except KeyError:
+            log.warning(f'Unknown card profile "{name}", using full quality instead.')
+            return DEFAULT_PROFILES["full"]
+
+    def start(self):
+        """
+        Start the worker processes. Called automatically on the first render.
+        """
+        if self._pool is not None or self.workers == 0:
+            return
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.layers, self.assets, self.prewarm),
+        )
+        log.info(f"Started card rendering pool with {self._pool._max_workers} workers.")
+
+    def shutdown(self):
+        if self._pool is None:
+            return
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+        log.info("Card rendering pool stopped.")
+
+    async def _submit(self, func: Callable[..., T], *args) -> T:
+        self.start()
+        pool = self._pool
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(pool, func, *args)
+        except BrokenProcessPool:
+            # concurrent renders all fail with the same pool, only the first one restarts it
+            if self._pool is pool and pool is not None:
+                log.error("Card rendering pool crashed, restarting it", exc_info=True)
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+                self.start()
+            return await loop.run_in_executor(self._pool, func, *args)
+
+    async def render_spec(self, spec: CardSpec, profile: CardProfile | None = None) -> bytes:
+        """
+        Return the encoded card for this spec, from the cache if possible.
+        """
+        profile = profile or self.default_profile
+        key = card_cache_key(spec, profile)
+        if (data := card_cache.get(key)) is not None:
+            return data
+        self.pending += 1
+        try:
+            async with self._slots:
+                data = await self._submit(encode_card, spec, profile)
+        finally:
+            self.pending -= 1
+        card_cache.set(key, data)
+        return data
+
+    async def render(
+        self, ball_instance: "BallInstance", profile: CardProfile | None = None
+    ) -> BytesIO:
+        """
+        Draw the card of a ball instance.
+
+        Parameters
+        ----------
+        ball_instance: BallInstance
+            The instance to draw. Its ball, and special if any, must be available.
+        profile: CardProfile | None
+            The output profile, defaults to `default_profile`.
+
+        Returns
+        -------
+        BytesIO
+            The encoded card.
+        """
+        return BytesIO(await self.render_spec(CardSpec.from_instance(ball_instance), profile))
+
+    async def _render_chunk(
+        self, specs: dict[str, CardSpec], profile: CardProfile
+    ) -> dict[str, bytes]:
+        self.pending += len(specs)
+        try:
+            async with self._slots:
+                results = await self._submit(encode_cards, list(specs.values()), profile)
+        finally:
+            self.pending -= len(specs)
+        rendered = dict(zip(specs.keys(), results))
+        for key, data in rendered.items():
+            card_cache.set(key, data)
+        return rendered
+
+    async def render_many(
+        self,
+        ball_instances: Iterable["BallInstance"],
+        profile: CardProfile | None = None,
+        *,
+        chunk_size: int = 8,
+    ) -> AsyncIterator[tuple["BallInstance", BytesIO]]:
+        """
+        Draw the cards of multiple ball instances, yielding them as soon as they are ready.
+
+        Instances sharing the same base layer (same ball and background) are drawn together
+        in the same worker, by chunks of `chunk_size` cards, and the chunks are spread across
+        the pool. Cached cards are yielded first, then the others in completion order, not in
+        the order of `ball_instances`. Identical cards are only drawn once.
+
+        Parameters
+        ----------
+        ball_instances: Iterable[BallInstance]
+            The instances to draw. Their ball, and special if any, must be available.
+        profile: CardProfile | None
+            The output profile, defaults to `default_profile`.
+        chunk_size: int
+            Maximum number of cards drawn in a single task.
+
+        Yields
+        ------
+        tuple[BallInstance, BytesIO]
+            Each instance with its encoded card.
+        """
+        profile = profile or self.default_profile
+        # cache key -> instances with that card, grouped by base layer
+        groups: defaultdict[tuple, dict[str, list["BallInstance"]]] = defaultdict(dict)
+        specs: dict[str, CardSpec] = {}
+        for ball_instance in ball_instances:
+            spec = CardSpec.from_instance(ball_instance)
+            key = card_cache_key(spec, profile)
+            if (data := card_cache.get(key)) is not None:
+                yield ball_instance, BytesIO(data)
+                continue
+            specs[key] = spec
+            groups[spec.base_key].setdefault(key, []).append(ball_instance)
+
+        tasks: list[asyncio.Task[dict[str, bytes]]] = []
+        for group in groups.values():
+            keys = list(group)
+            for i in range(0, len(keys), chunk_size):
+                chunk = {key: specs[key] for key in keys[i : i + chunk_size]}
+                tasks.append(asyncio.create_task(self._render_chunk(chunk, profile)))
+        try:
+            for task in asyncio.as_completed(tasks):
+                for key, data in (await task).items():
+                    for ball_instance in groups[specs[key].base_key][key]:
+                        yield ball_instance, BytesIO(data)
+        finally:
+            # the caller stopped iterating or an error occurred, don't draw the other cards
+            for task in tasks:
+                task.cancel()
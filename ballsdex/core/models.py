@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from enum import IntEnum
 from io import BytesIO
@@ -12,16 +11,39 @@ from fastapi_admin.models import AbstractAdmin
 from tortoise import exceptions, fields, models, signals, timezone, validators
 from tortoise.expressions import Q
 
-from ballsdex.core.image_generator.image_gen import draw_card
+from ballsdex.core.image_generator.cache import card_cache, card_cache_key
+from ballsdex.core.image_generator.formats import DEFAULT_PROFILES, card_filename
+from ballsdex.core.image_generator.image_gen import CardSpec, invalidate_base_layers
+from ballsdex.core.image_generator.renderer import encode_card
+from ballsdex.core.utils.user_cache import user_cache
 
 if TYPE_CHECKING:
     from tortoise.backends.base.client import BaseDBAsyncClient
 
+    from ballsdex.core.image_generator.renderer import CardRenderer
+
 
 balls: dict[int, Ball] = {}
 regimes: dict[int, Regime] = {}
 economies: dict[int, Economy] = {}
 specials: dict[int, Special] = {}
+_cache_generation = 0
+
+
+def cache_generation() -> int:
+    """
+    Return a number incremented every time the caches above are reloaded. Data derived from
+    the caches can be rebuilt only when this changes.
+    """
+    return _cache_generation
+
+
+def bump_cache_generation():
+    """
+    Mark the caches as reloaded, must be called after modifying them.
+    """
+    global _cache_generation
+    _cache_generation += 1
 
 
 async def lower_catch_names(
@@ -89,6 +111,28 @@ class GuildConfig(models.Model):
     )
 
 
+class SpawnState(models.Model):
+    guild_id = fields.BigIntField(
+        description="Discord guild ID", unique=True, validators=[DiscordSnowflakeValidator()]
+    )
+    amount = fields.FloatField(description="Spawn progress of the guild")
+    chance = fields.IntField(description="Progress to reach before the next spawn")
+    time = fields.DatetimeField(description="Time of the last spawn or of the first message")
+    chatters = fields.JSONField(description="Statistics of the recent messages", default={})
+    updated_at = fields.DatetimeField(auto_now=True)
+
+
+class CatchEvent(models.Model):
+    ball_id = fields.IntField(description="ID of the caught ball")
+    player_id = fields.BigIntField(description="Discord user ID of the player")
+    guild_id = fields.BigIntField(description="Discord guild ID", null=True)
+    shiny = fields.BooleanField(default=False)
+    special_id = fields.IntField(description="ID of the special event", null=True)
+    guild_size = fields.IntField(description="Member count of the guild", null=True)
+    spawned_at = fields.DatetimeField(null=True)
+    caught_at = fields.DatetimeField(index=True)
+
+
 class Regime(models.Model):
     name = fields.CharField(max_length=64)
     background = fields.CharField(max_length=200, description="1428x2000 PNG image")
@@ -134,6 +178,8 @@ class Special(models.Model):
 class Ball(models.Model):
     regime_id: int
     economy_id: int
+    # the table also has a "search_text" column generated by the database from the names below,
+    # with a trigram index for autocompletion. It's not declared here since it can't be written.
 
     country = fields.CharField(max_length=48, unique=True)
     short_name = fields.CharField(max_length=12, null=True, default=None)
@@ -194,8 +240,19 @@ class Ball(models.Model):
         return economies.get(self.economy_id, self.economy)
 
 
+async def drop_card_layers(
+    model: Type[Ball],
+    instance: Ball,
+    created: bool,
+    using_db: "BaseDBAsyncClient | None" = None,
+    update_fields: Iterable[str] | None = None,
+):
+    invalidate_base_layers(instance.pk)
+
+
 Ball.register_listener(signals.Signals.pre_save, lower_catch_names)
 Ball.register_listener(signals.Signals.pre_save, lower_translations)
+Ball.register_listener(signals.Signals.post_save, drop_card_layers)
 
 
 class BallInstance(models.Model):
@@ -232,6 +289,8 @@ class BallInstance(models.Model):
 
     class Meta:
         unique_together = ("player", "id")
+        # used by the player statistics triggers
+        indexes = (("player_id", "ball_id"),)
 
     @property
     def is_tradeable(self) -> bool:
@@ -325,42 +384,36 @@ class BallInstance(models.Model):
         return text
 
     def draw_card(self) -> BytesIO:
-        image = draw_card(self)
-        buffer = BytesIO()
-        image.save(buffer, format="png")
-        buffer.seek(0)
-        image.close()
-        return buffer
+        """
+        Draw the card in the current thread. Prefer `BallsDexBot.card_renderer` in the bot.
+        """
+        spec = CardSpec.from_instance(self)
+        profile = DEFAULT_PROFILES["full"]
+        key = card_cache_key(spec, profile)
+        if (data := card_cache.get(key)) is None:
+            data = encode_card(spec, profile)
+            card_cache.set(key, data)
+        return BytesIO(data)
 
     async def prepare_for_message(
-        self, interaction: discord.Interaction
+        self, interaction: discord.Interaction, *, preview: bool = False
     ) -> Tuple[str, discord.File]:
+        """
+        Build the content and the card file of a message showing this instance.
+
+        Parameters
+        ----------
+        interaction: discord.Interaction
+            The interaction this message replies to.
+        preview: bool
+            Encode the card with the cheaper preview profile, for list views.
+        """
         # message content
         trade_content = ""
         await self.fetch_related("trade_player", "special")
         if self.trade_player:
-            original_player = None
-            # we want to avoid calling fetch_user if possible (heavily rate-limited call)
-            if interaction.guild:
-                try:
-                    original_player = await interaction.guild.fetch_member(
-                        int(self.trade_player.discord_id)
-                    )
-                except discord.NotFound:
-                    pass
-            elif original_player is None:  # try again if not found in guild
-                try:
-                    original_player = await interaction.client.fetch_user(
-                        int(self.trade_player.discord_id)
-                    )
-                except discord.NotFound:
-                    pass
-
-            original_player_name = (
-                original_player.name
-                if original_player
-                else f"user with ID {self.trade_player.discord_id}"
-            )
+            # never wait for the API here, the name is fetched in the background if needed
+            original_player_name = user_cache.name(int(self.trade_player.discord_id))
             trade_content = f"Obtained by trade with {original_player_name}.\n"
         content = (
             f"ID: `#{self.pk:0X}`\n"
@@ -371,10 +424,11 @@ class BallInstance(models.Model):
         )
 
         # draw image
-        with ThreadPoolExecutor() as pool:
-            buffer = await interaction.client.loop.run_in_executor(pool, self.draw_card)
+        renderer: "CardRenderer" = interaction.client.card_renderer  # type: ignore
+        profile = renderer.preview_profile if preview else renderer.default_profile
+        buffer = await renderer.render(self, profile)
 
-        return content, discord.File(buffer, "card.png")
+        return content, discord.File(buffer, card_filename(buffer.getvalue()))
 
     async def lock_for_trade(self):
         self.locked = timezone.now()
@@ -439,6 +493,7 @@ class Player(models.Model):
         default=FriendPolicy.ALLOW,
     )
     balls: fields.BackwardFKRelation[BallInstance]
+    stats: fields.BackwardOneToOneRelation[PlayerStats]
 
     def __str__(self) -> str:
         return str(self.discord_id)
@@ -457,6 +512,21 @@ class Player(models.Model):
         return self.mention_policy == MentionPolicy.ALLOW
 
 
+# kept up to date by triggers on the ballinstance table, reconciled by the leaderboard
+class PlayerStats(models.Model):
+    """
+    Counters of the instances owned by a player, maintained by the database
+    """
+
+    player: fields.OneToOneRelation[Player] = fields.OneToOneField(
+        "models.Player", pk=True, on_delete=fields.CASCADE, related_name="stats"
+    )
+    total = fields.IntField(description="Number of instances", default=0, index=True)
+    shiny = fields.IntField(description="Number of shiny instances", default=0, index=True)
+    special = fields.IntField(description="Number of instances with a special", default=0)
+    distinct_balls = fields.IntField(description="Number of different balls", default=0)
+
+
 class BlacklistedID(models.Model):
     discord_id = fields.BigIntField(
         description="Discord user ID", unique=True, validators=[DiscordSnowflakeValidator()]
@@ -0,0 +1,95 @@
+import difflib
+import unicodedata
+from typing import Iterable
+
+from ballsdex.core.models import Ball, balls, cache_generation
+
+
+def normalize_name(name: str) -> str:
+    """
+    Return the form of a name used for comparisons: accents are stripped, the case is folded
+    and whitespace is collapsed, so "  Côte   d'Ivoire" and "cote d'ivoire" are equal.
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(x for x in decomposed if not unicodedata.combining(x))
+    return " ".join(stripped.casefold().split())
+
+
+def ball_names(ball: Ball) -> set[str]:
+    """
+    Return the normalized names accepted when catching a ball: its country name, catch names
+    and translations.
+    """
+    names = [ball.country]
+    if ball.catch_names:
+        names.extend(ball.catch_names.split(";"))
+    if ball.translations:
+        names.extend(ball.translations.split(";"))
+    return {normalized for x in names if (normalized := normalize_name(x))}
+
+
+class CatchNameIndex:
+    """
+    Map of the normalized catch names to the balls they designate.
+
+    Checking a guess is a single hash lookup. Build it once per reload of the balls cache with
+    `get_catch_name_index`.
+
+    Parameters
+    ----------
+    balls: Iterable[Ball]
+        The balls to index.
+    """
+
+    def __init__(self, balls: Iterable[Ball]):
+        self.names: dict[str, set[int]] = {}
+        self.indexed: set[int] = set()
+        for ball in balls:
+            self.indexed.add(ball.pk)
+            for name in ball_names(ball):
+                self.names.setdefault(name, set()).add(ball.pk)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def lookup(self, name: str) -> set[int]:
+        """
+        Return the IDs of the balls having this name.
+        """
+        return self.names.get(normalize_name(name), set())
+
+    def matches(self, ball: Ball, guess: str) -> bool:
+        """
+        Check if a guess is one of the names of a ball.
+        """
+        if ball.pk not in self.indexed:
+            # the ball was added after the index was built
+            return normalize_name(guess) in ball_names(ball)
+        return ball.pk in self.lookup(guess)
+
+    def suggest(self, name: str, limit: int = 5, cutoff: float = 0.75) -> list[int]:
+        """
+        Return the IDs of the balls with a name close to `name`, the closest first. Used for
+        "did you mean" hints when nothing matches exactly.
+        """
+        results: dict[int, None] = {}
+        for match in difflib.get_close_matches(normalize_name(name), self.names, limit, cutoff):
+            for pk in sorted(self.names[match]):
+                results[pk] = None
+        return list(results)[:limit]
+
+
+# index of the cached balls, with the cache generation it was built from
+_index: tuple[int, CatchNameIndex] | None = None
+
+
+def get_catch_name_index() -> CatchNameIndex:
+    """
+    Return the catch name index of the cached balls, rebuilt only when the balls cache is
+    reloaded.
+    """
+    global _index
+    generation = cache_generation()
+    if _index is None or _index[0] != generation:
+        _index = (generation, CatchNameIndex(balls.values()))
+    return _index[1]
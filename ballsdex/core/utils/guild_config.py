@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import time
+
+from ballsdex.core.models import GuildConfig
+
+log = logging.getLogger("ballsdex.core.utils.guild_config")
+
+
+class GuildConfigCache:
+    """
+    In-process copy of the `GuildConfig` table, loaded in bulk at startup and updated when a
+    `ballsdex_settings_change` event is dispatched, so hot paths such as catching can read the
+    configuration of a guild without querying the database.
+
+    If a TTL is configured, entries older than it are still returned, but reloaded in the
+    background to pick up edits made outside of the bot (admin panel, other instances).
+
+    Parameters
+    ----------
+    ttl: float
+        Seconds after which an entry is reloaded from the database, 0 to disable.
+    """
+
+    def __init__(self, ttl: float = 0):
+        self.ttl = ttl
+        self._configs: dict[int, tuple[float, GuildConfig]] = {}
+        self._refreshing: set[int] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._configs)
+
+    def configure(self, ttl: float):
+        self.ttl = ttl
+
+    def values(self) -> list[GuildConfig]:
+        return [config for _, config in self._configs.values()]
+
+    async def load(self) -> int:
+        """
+        Replace the cache with all the configurations of the database.
+
+        Returns
+        -------
+        int
+            The number of configurations loaded.
+        """
+        now = time.monotonic()
+        self._configs = {config.guild_id: (now, config) for config in await GuildConfig.all()}
+        return len(self._configs)
+
+    def set(self, config: GuildConfig):
+        """
+        Store a configuration that was just read or saved.
+        """
+        self._configs[config.guild_id] = (time.monotonic(), config)
+
+    def get(self, guild_id: int | None) -> GuildConfig | None:
+        """
+        Return the cached configuration of a guild without querying the database, `None` if
+        the guild has no configuration. Stale entries are reloaded in the background.
+        """
+        if guild_id is None or (entry := self._configs.get(guild_id)) is None:
+            return None
+        loaded_at, config = entry
+        if self.ttl and time.monotonic() - loaded_at > self.ttl:
+            self._schedule_refresh(guild_id)
+        return config
+
+    def is_silent(self, guild_id: int | None) -> bool:
+        """
+        Whether the responses to guesses should be ephemeral in this guild.
+        """
+        config = self.get(guild_id)
+        return config.silent if config else False
+
+    async def refresh(self, guild_id: int) -> GuildConfig | None:
+        """
+        Reload the configuration of a guild from the database.
+        """
+        config = await GuildConfig.get_or_none(guild_id=guild_id)
+        if config is None:
+            self._configs.pop(guild_id, None)
+        else:
+            self.set(config)
+        return config
+
+    def _schedule_refresh(self, guild_id: int):
+        if guild_id in self._refreshing:
+            return
+        self._refreshing.add(guild_id)
+
+        async def refresh():
+            try:
+                await self.refresh(guild_id)
+            except Exception:
+                log.warning(f"Failed to reload the config of guild {guild_id}", exc_info=True)
+            finally:
+                self._refreshing.discard(guild_id)
+
+        task = asyncio.create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+guild_configs = GuildConfigCache()
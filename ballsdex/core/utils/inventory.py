@@ -0,0 +1,397 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from cachetools import LRUCache, TTLCache
+from tortoise import Tortoise, signals, timezone
+from tortoise.expressions import Q, RawSQL
+
+from ballsdex.core.models import BallInstance, Player, balls, cache_generation, specials
+
+log = logging.getLogger("ballsdex.core.utils.inventory")
+
+# number of players whose inventory is kept in memory
+INVENTORY_CACHE_SIZE = 2000
+# seconds after which an inventory is loaded again, to include the edits made from the admin
+# panel which don't go through the signals of this process
+INVENTORY_TTL = 600
+# inventories larger than this are not kept in memory but searched in the database
+INVENTORY_MAX_SIZE = 5000
+# an instance locked for longer than this is considered unlocked
+LOCK_DURATION = timedelta(minutes=30)
+
+
+@dataclass(slots=True)
+class InventoryEntry:
+    """
+    The fields of a `BallInstance` needed to search and describe it.
+    """
+
+    pk: int
+    ball_id: int
+    special_id: int | None
+    shiny: bool
+    favorite: bool
+    attack_bonus: int
+    health_bonus: int
+    locked: datetime | None
+    hex: str
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "InventoryEntry":
+        return cls(*row, hex=f"{row[0]:x}")
+
+    @classmethod
+    def from_instance(cls, instance: BallInstance) -> "InventoryEntry":
+        return cls(
+            instance.pk,
+            instance.ball_id,
+            instance.special_id,
+            instance.shiny,
+            instance.favorite,
+            instance.attack_bonus,
+            instance.health_bonus,
+            instance.locked,
+            f"{instance.pk:x}",
+        )
+
+    def is_locked(self, now: datetime) -> bool:
+        return self.locked is not None and self.locked > now - LOCK_DURATION
+
+    def to_instance(self) -> BallInstance:
+        """
+        Build an unsaved `BallInstance` with the cached fields, enough for `description`.
+        """
+        return BallInstance(
+            id=self.pk,
+            ball=balls.get(self.ball_id),
+            ball_id=self.ball_id,
+            special=specials.get(self.special_id) if self.special_id else None,
+            special_id=self.special_id,
+            shiny=self.shiny,
+            favorite=self.favorite,
+            attack_bonus=self.attack_bonus,
+            health_bonus=self.health_bonus,
+            locked=self.locked,
+        )
+
+
+class _InventoryCache(TTLCache):
+    def __init__(self, maxsize: int, ttl: float, index: "InventoryIndex"):
+        super().__init__(maxsize, ttl)
+        self.index = index
+
+    def popitem(self):
+        player_id, inventory = super().popitem()
+        self.index._forget(inventory)
+        return player_id, inventory
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for _, inventory in expired:
+            self.index._forget(inventory)
+        return expired
+
+
+class InventoryIndex:
+    """
+    In-memory copy of the inventories of the players who recently used autocompletion.
+
+    An inventory is loaded with a single query the first time its player needs it, then kept
+    current by the save and delete signals of `BallInstance` (catches, trades, locks,
+    deletions). Searches then run in memory, without a database round trip per keystroke.
+
+    Bulk operations bypassing the signals (`QuerySet.delete`, `QuerySet.update`) must call
+    `invalidate` for the affected players.
+
+    Parameters
+    ----------
+    maxsize: int
+        Maximum number of inventories kept, the least recently used are dropped.
+    ttl: float
+        Seconds after which an inventory is loaded again from the database.
+    max_inventory_size: int
+        Inventories with more instances are not loaded, `search_database` must be used.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = INVENTORY_CACHE_SIZE,
+        ttl: float = INVENTORY_TTL,
+        max_inventory_size: int = INVENTORY_MAX_SIZE,
+    ):
+        self.max_inventory_size = max_inventory_size
+        self._inventories: _InventoryCache = _InventoryCache(maxsize, ttl, self)
+        # discord ID to player ID of the players whose inventory is too large
+        self._too_large: TTLCache[int, int] = TTLCache(maxsize, ttl)
+        # discord ID to player ID
+        self._player_ids: LRUCache[int, int] = LRUCache(maxsize)
+        # instance ID to player ID, for the cached inventories
+        self._owners: dict[int, int] = {}
+        # changes received while an inventory is being loaded, applied once it's done
+        self._loading: dict[int, list[tuple[BallInstance, bool]]] = {}
+        # inventories being loaded, by discord ID
+        self._loads: dict[int, asyncio.Task[dict[int, InventoryEntry] | None]] = {}
+        # search text of the balls, with the cache generation it was built from
+        self._ball_names: tuple[int, dict[int, list[str]]] | None = None
+
+    def __len__(self) -> int:
+        return len(self._inventories)
+
+    def _forget(self, inventory: dict[int, InventoryEntry]):
+        for pk in inventory:
+            self._owners.pop(pk, None)
+
+    async def get(self, discord_id: int) -> dict[int, InventoryEntry] | None:
+        """
+        Return the inventory of a player, loading it if needed. The returned mapping must not
+        be modified. `None` is returned if the inventory is too large to be kept in memory.
+        """
+        if (inventory := self._get_cached(discord_id)) is not None:
+            return inventory
+        if discord_id in self._too_large:
+            return None
+        # a player typing sends many autocomplete requests, load the inventory only once. The
+        # load is shielded, a request giving up on it doesn't cancel it for the next ones
+        if (task := self._loads.get(discord_id)) is None:
+            task = self._loads[discord_id] = asyncio.create_task(self._load(discord_id))
+            task.add_done_callback(lambda x: self._load_done(discord_id, x))
+        return await asyncio.shield(task)
+
+    def _load_done(self, discord_id: int, task: asyncio.Task):
+        del self._loads[discord_id]
+        if not task.cancelled() and (exc := task.exception()):
+            # the requests still waiting get the exception, but there may be none left
+            log.debug(f"Failed to load the inventory of {discord_id}", exc_info=exc)
+
+    def _get_cached(self, discord_id: int) -> dict[int, InventoryEntry] | None:
+        if (player_id := self._player_ids.get(discord_id)) is None:
+            return None
+        return self._inventories.get(player_id)
+
+    async def _load(self, discord_id: int) -> dict[int, InventoryEntry] | None:
+        player = await Player.get_or_none(discord_id=discord_id).only("id")
+        if player is None:
+            return {}
+        self._loading[player.pk] = []
+        try:
+            rows = (
+                await BallInstance.filter(player_id=player.pk)
+                .order_by("id")
+                .limit(self.max_inventory_size + 1)
+                .values_list(
+                    "id",
+                    "ball_id",
+                    "special_id",
+                    "shiny",
+                    "favorite",
+                    "attack_bonus",
+                    "health_bonus",
+                    "locked",
+                )
+            )
+            inventory = {row[0]: InventoryEntry.from_row(row) for row in rows}
+        finally:
+            changes = self._loading.pop(player.pk)
+        if len(inventory) > self.max_inventory_size:
+            self._too_large[discord_id] = player.pk
+            return None
+
+        self._player_ids[discord_id] = player.pk
+        self._inventories[player.pk] = inventory
+        for pk in inventory:
+            self._owners[pk] = player.pk
+        for instance, deleted in changes:
+            self._apply(instance, deleted)
+        return inventory
+
+    def _apply(self, instance: BallInstance, deleted: bool):
+        previous_owner = self._owners.pop(instance.pk, None)
+        if previous_owner is not None:
+            if (inventory := self._inventories.get(previous_owner)) is not None:
+                inventory.pop(instance.pk, None)
+        if deleted:
+            return
+        if (inventory := self._inventories.get(instance.player_id)) is not None:
+            inventory[instance.pk] = InventoryEntry.from_instance(instance)
+            self._owners[instance.pk] = instance.player_id
+
+    def update(self, instance: BallInstance, deleted: bool = False):
+        """
+        Apply the creation, edition or deletion of an instance to the cached inventories.
+        """
+        # the inventories being loaded may or may not include this change, it's applied again
+        # once they are loaded (the previous owner isn't known before that)
+        for changes in self._loading.values():
+            changes.append((instance, deleted))
+        self._apply(instance, deleted)
+
+    def invalidate(self, player_id: int):
+        """
+        Drop the cached inventory of a player, given its database ID (not its Discord ID).
+        """
+        if (inventory := self._inventories.pop(player_id, None)) is not None:
+            self._forget(inventory)
+
+    def _get_ball_names(self) -> dict[int, list[str]]:
+        generation = cache_generation()
+        if self._ball_names is None or self._ball_names[0] != generation:
+            names: dict[int, list[str]] = {}
+            for ball in balls.values():
+                names[ball.pk] = [ball.country.lower()]
+                if ball.catch_names:
+                    names[ball.pk].extend(ball.catch_names.lower().split(";"))
+            self._ball_names = (generation, names)
+        return self._ball_names[1]
+
+    def search(
+        self,
+        inventory: dict[int, InventoryEntry],
+        value: str,
+        *,
+        special_id: int | None = None,
+        shiny: bool | None = None,
+        locked: bool | None = None,
+        limit: int = 25,
+    ) -> list[InventoryEntry]:
+        """
+        Search an inventory by hexadecimal ID, country or catch name. Entries with an ID or a
+        name starting with `value` are returned first, then those containing it.
+
+        Parameters
+        ----------
+        inventory: dict[int, InventoryEntry]
+            The inventory returned by `get`.
+        value: str
+            The text to search.
+        special_id: int | None
+            Only return the instances with this special.
+        shiny: bool | None
+            Only return shiny or non-shiny instances.
+        locked: bool | None
+            Only return the instances locked or not locked for a trade.
+        limit: int
+            Maximum number of results.
+        """
+        value = value.replace(".", "").lower()
+        prefix_balls: set[int] = set()
+        matching_balls: set[int] = set()
+        for ball_id, names in self._get_ball_names().items():
+            if any(x.startswith(value) for x in names):
+                prefix_balls.add(ball_id)
+                matching_balls.add(ball_id)
+            elif any(value in x for x in names):
+                matching_balls.add(ball_id)
+
+        now = timezone.now()
+        prefix: list[InventoryEntry] = []
+        substring: list[InventoryEntry] = []
+        for entry in inventory.values():
+            if special_id is not None and entry.special_id != special_id:
+                continue
+            if shiny is not None and entry.shiny != shiny:
+                continue
+            if locked is not None and entry.is_locked(now) != locked:
+                continue
+            if entry.ball_id in prefix_balls or entry.hex.startswith(value):
+                prefix.append(entry)
+                if len(prefix) == limit:
+                    break
+            elif len(substring) < limit and (
+                entry.ball_id in matching_balls or value in entry.hex
+            ):
+                substring.append(entry)
+        return (prefix + substring)[:limit]
+
+    async def search_database(
+        self,
+        discord_id: int,
+        value: str,
+        *,
+        special_id: int | None = None,
+        shiny: bool | None = None,
+        locked: bool | None = None,
+        limit: int = 25,
+    ) -> list[BallInstance]:
+        """
+        Search an inventory too large to be kept in memory. The instances are filtered by
+        player first, then the balls matching `value` are found with the trigram index of
+        `ball.search_text`. Same parameters as `search`, but results aren't ranked.
+        """
+        if (player_id := self._too_large.get(discord_id)) is None:
+            queryset = BallInstance.filter(player__discord_id=discord_id)
+        else:
+            queryset = BallInstance.filter(player_id=player_id)
+        if special_id is not None:
+            queryset = queryset.filter(special_id=special_id)
+        if shiny is not None:
+            queryset = queryset.filter(shiny=shiny)
+        if locked is not None:
+            unlocked_before = timezone.now() - LOCK_DURATION
+            if locked:
+                queryset = queryset.filter(locked__isnull=False, locked__gt=unlocked_before)
+            else:
+                queryset = queryset.filter(Q(locked__isnull=True) | Q(locked__lte=unlocked_before))
+
+        value = value.replace(".", "").lower()
+        if value:
+            condition = Q(hex__contains=value)
+            if ball_ids := await search_ball_ids(value):
+                condition |= Q(ball_id__in=ball_ids)
+            queryset = queryset.annotate(hex=RawSQL("to_hex(ballinstance.id)")).filter(condition)
+        return await queryset.limit(limit)
+
+
+inventory_index = InventoryIndex()
+
+
+async def search_inventory(
+    discord_id: int,
+    value: str,
+    *,
+    special_id: int | None = None,
+    shiny: bool | None = None,
+    locked: bool | None = None,
+    limit: int = 25,
+) -> list[BallInstance]:
+    """
+    Search the inventory of a player, in memory if possible, otherwise in the database.
+    See `InventoryIndex.search` for the parameters.
+    """
+    filters = dict(special_id=special_id, shiny=shiny, locked=locked, limit=limit)
+    if (inventory := await inventory_index.get(discord_id)) is not None:
+        return [x.to_instance() for x in inventory_index.search(inventory, value, **filters)]
+    return await inventory_index.search_database(discord_id, value, **filters)
+
+
+async def search_ball_ids(value: str) -> list[int]:
+    """
+    Return the IDs of the balls whose country, catch names or translations contain `value`,
+    using the trigram index of the `ball.search_text` column.
+    """
+    pattern = value.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    connection = Tortoise.get_connection("default")
+    _, rows = await connection.execute_query(
+        "SELECT id FROM ball WHERE search_text LIKE $1", [f"%{pattern}%"]
+    )
+    return [row["id"] for row in rows]
+
+
+async def _on_instance_saved(
+    sender: type[BallInstance], instance: BallInstance, created: bool, using_db, update_fields
+):
+    inventory_index.update(instance)
+
+
+async def _on_instance_deleted(sender: type[BallInstance], instance: BallInstance, using_db):
+    inventory_index.update(instance, deleted=True)
+
+
+async def _on_player_deleted(sender: type[Player], instance: Player, using_db):
+    inventory_index.invalidate(instance.pk)
+
+
+BallInstance.register_listener(signals.Signals.post_save, _on_instance_saved)
+BallInstance.register_listener(signals.Signals.post_delete, _on_instance_deleted)
+Player.register_listener(signals.Signals.post_delete, _on_player_deleted)
@@ -0,0 +1,196 @@
+"""
+Benchmark the ball instance autocompletion against a seeded Postgres database.
+
+Three strategies are compared for random players and search values:
+- "before": the former query, an ILIKE over the concatenation of the instance's hexadecimal ID
+  and its ball's names, joined for every instance of the player;
+- "trigram": the database fallback, filtering the instances by player then matching the balls
+  with the trigram index of `ball.search_text` (migration 38);
+- "memory": the inventory index, including the first load of each inventory.
+
+The database given with BALLSDEXBOT_DB_URL must be a scratch database already migrated with the
+bot. Seeding adds balls, players and instances to it, which are not removed afterwards.
+
+Run with `python -m ballsdex.core.utils.inventory_benchmark --help`.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from typing import Awaitable, Callable
+
+from tortoise import Tortoise
+from tortoise.expressions import RawSQL
+
+from ballsdex.core.models import Ball, BallInstance, Player, Regime, balls, bump_cache_generation
+from ballsdex.core.utils.inventory import InventoryIndex
+
+# seeded players have discord IDs starting from this one
+FIRST_DISCORD_ID = 100_000_000_000_000_000
+SYLLABLES = ("ar", "bo", "ca", "de", "el", "fi", "go", "ha", "ir", "ja", "ko", "lu", "ma", "ne")
+
+
+def random_name(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+
+
+async def seed(instances: int, players: int, ball_count: int, rng: random.Random):
+    """
+    Add balls, players and instances. Instances are spread unevenly, a few players own most of
+    them like in production.
+    """
+    regime = await Regime.create(name="Benchmark", background="/benchmark.png")
+    names = {random_name(rng) for _ in range(ball_count * 2)}
+    new_balls = [
+        Ball(
+            country=f"{name} {i}",
+            catch_names=";".join(random_name(rng).lower() for _ in range(2)),
+            translations=random_name(rng).lower(),
+            regime=regime,
+            health=1,
+            attack=1,
+            rarity=1,
+            emoji_id=FIRST_DISCORD_ID,
+            wild_card="/benchmark.png",
+            collection_card="/benchmark.png",
+            credits="benchmark",
+            capacity_name="benchmark",
+            capacity_description="benchmark",
+        )
+        for i, name in zip(range(ball_count), names)
+    ]
+    await Ball.bulk_create(new_balls, batch_size=1000)
+    await Player.bulk_create(
+        [Player(discord_id=FIRST_DISCORD_ID + i) for i in range(players)], batch_size=5000
+    )
+
+    connection = Tortoise.get_connection("default")
+    ball_ids = await Ball.filter(regime=regime).values_list("id", flat=True)
+    player_ids = await Player.filter(discord_id__gte=FIRST_DISCORD_ID).values_list("id", flat=True)
+    first_player, last_player = min(player_ids), max(player_ids)
+    batch = 1_000_000
+    for start in range(0, instances, batch):
+        count = min(batch, instances - start)
+        # the cube of a uniform value gives most instances to the first players
+        await connection.execute_query(
+            """
+            INSERT INTO ballinstance (ball_id, player_id, catch_date, shiny, favorite,
+                health_bonus, attack_bonus, tradeable, extra_data)
+            SELECT ($1::int[])[1 + floor(random() * array_length($1::int[], 1))::int],
+                $2 + floor(power(random(), 3) * ($3 - $2 + 1))::int,
+                now(), random() < 0.01, false, 0, 0, true, '{}'
+            FROM generate_series(1, $4)
+            """,
+            [ball_ids, first_player, last_player, count],
+        )
+        print(f"Seeded {start + count}/{instances} instances")
+    await connection.execute_query("ANALYZE ballinstance")
+    await connection.execute_query("ANALYZE ball")
+
+
+async def query_before(discord_id: int, value: str):
+    # the query used before the inventory index
+    await (
+        BallInstance.filter(player__discord_id=discord_id)
+        .select_related("ball")
+        .annotate(
+            searchable=RawSQL(
+                "to_hex(ballinstance.id) || ' ' || ballinstance__ball.country || "
+                "' ' || ballinstance__ball.catch_names"
+            )
+        )
+        .filter(searchable__icontains=value)
+        .limit(25)
+    )
+
+
+async def measure(
+    func: Callable[[int, str], Awaitable], queries: list[tuple[int, str]]
+) -> list[float]:
+    timings: list[float] = []
+    for discord_id, value in queries:
+        start = time.perf_counter()
+        await func(discord_id, value)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+async def run(args: argparse.Namespace):
+    await Tortoise.init(
+        db_url=os.environ["BALLSDEXBOT_DB_URL"], modules={"models": ["ballsdex.core.models"]}
+    )
+    try:
+        rng = random.Random(args.seed)
+        if args.seed_instances:
+            await seed(args.seed_instances, args.players, args.balls, rng)
+
+        for ball in await Ball.all():
+            balls[ball.pk] = ball
+        bump_cache_generation()
+        discord_ids = await Player.filter(discord_id__gte=FIRST_DISCORD_ID).values_list(
+            "discord_id", flat=True
+        )
+        if not discord_ids:
+            raise SystemExit("No seeded player found, use --seed-instances first.")
+
+        names = [x.country.lower() for x in balls.values()]
+        queries = [
+            (rng.choice(discord_ids), rng.choice(names)[: rng.randint(1, 4)])
+            for _ in range(args.queries)
+        ]
+        memory = InventoryIndex(max_inventory_size=args.max_inventory)
+        # every inventory is too large for this one, it always searches the database
+        trigram = InventoryIndex(max_inventory_size=0)
+
+        async def query_memory(discord_id: int, value: str):
+            inventory = await memory.get(discord_id)
+            if inventory is None:
+                await memory.search_database(discord_id, value)
+            else:
+                memory.search(inventory, value)
+
+        strategies = {
+            "before": query_before,
+            "trigram": lambda discord_id, value: trigram.search_database(discord_id, value),
+            "memory": query_memory,
+        }
+        print(f"{'strategy':<10}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+        for name, func in strategies.items():
+            timings = await measure(func, queries)
+            print(
+                f"{name:<10}{statistics.median(timings):>9.2f}"
+                f"{statistics.quantiles(timings, n=100)[98]:>9.2f}{max(timings):>9.2f}"
+            )
+    finally:
+        await Tortoise.close_connections()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--seed-instances",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Seed the database with N instances first (10000000 for the reference benchmark)",
+    )
+    parser.add_argument("--players", type=int, default=100_000, help="Players to seed")
+    parser.add_argument("--balls", type=int, default=500, help="Balls to seed")
+    parser.add_argument("--queries", "-n", type=int, default=1000, help="Queries per strategy")
+    parser.add_argument(
+        "--max-inventory",
+        type=int,
+        default=5000,
+        help="Largest inventory kept in memory by the memory strategy",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import random
+from typing import Generic, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+class AliasSampler(Generic[T]):
+    """
+    Weighted random sampler using Vose's alias method.
+
+    Building the tables is O(n), then each draw is O(1) with a single random number, instead of
+    the O(n) work done by `random.choices` on every call. Build it once and reuse it as long as
+    the population and weights don't change.
+
+    Parameters
+    ----------
+    population: Sequence[T]
+        The items to draw from.
+    weights: Sequence[float]
+        The relative weight of each item. Items with a weight of 0 are never drawn.
+
+    Raises
+    ------
+    ValueError
+        The population is empty, the lengths don't match, a weight is negative or all weights
+        are 0.
+    """
+
+    __slots__ = ("population", "_probabilities", "_aliases")
+
+    def __init__(self, population: Sequence[T], weights: Sequence[float]):
+        if len(population) != len(weights):
+            raise ValueError("The number of weights does not match the population")
+        if not population:
+            raise ValueError("Cannot sample from an empty population")
+        if any(weight < 0 for weight in weights):
+            raise ValueError("Weights cannot be negative")
+        total = sum(weights)
+        if total <= 0:
+            raise ValueError("Total of weights must be greater than zero")
+
+        n = len(population)
+        self.population = list(population)
+        self._probabilities = [0.0] * n
+        self._aliases = list(range(n))
+
+        scaled = [weight * n / total for weight in weights]
+        small = [i for i, x in enumerate(scaled) if x < 1]
+        large = [i for i, x in enumerate(scaled) if x >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._probabilities[less] = scaled[less]
+            self._aliases[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1
+            (small if scaled[more] < 1 else large).append(more)
+        # leftovers are only due to rounding errors, they are always picked in their column
+        for i in small + large:
+            self._probabilities[i] = 1.0
+
+    def __len__(self) -> int:
+        return len(self.population)
+
+    def sample(self, rng: random.Random | None = None) -> T:
+        """
+        Draw a single item.
+
+        Parameters
+        ----------
+        rng: random.Random | None
+            The random generator to use, the global one by default.
+        """
+        value = (rng or random).random() * len(self.population)
+        column = min(int(value), len(self.population) - 1)
+        if value - column < self._probabilities[column]:
+            return self.population[column]
+        return self.population[self._aliases[column]]
+
+    def sample_many(self, k: int, rng: random.Random | None = None) -> list[T]:
+        """
+        Draw `k` items, with replacement.
+
+        Parameters
+        ----------
+        k: int
+            The number of items to draw.
+        rng: random.Random | None
+            The random generator to use, the global one by default.
+        """
+        return [self.sample(rng) for _ in range(k)]
@@ -0,0 +1,72 @@
+import bisect
+from typing import Generic, Iterable, TypeVar
+
+from ballsdex.core.utils.catch_names import normalize_name
+
+T = TypeVar("T")
+
+
+class SearchIndex(Generic[T]):
+    """
+    Index of items by one or more names, for autocompletion.
+
+    The names are normalized with `normalize_name` and kept in two sorted lists: the full names
+    and all their other suffixes. Finding the names equal to, starting with or containing the
+    searched text is then a binary search followed by a scan of the matches only, instead of
+    a comparison with every name. Build it once per change of the items.
+
+    Parameters
+    ----------
+    items: Iterable[tuple[T, Iterable[str]]]
+        The items with their names. Results with the same rank keep this order.
+    """
+
+    def __init__(self, items: Iterable[tuple[T, Iterable[str]]]):
+        self.items: list[T] = []
+        names: list[tuple[str, int]] = []
+        suffixes: list[tuple[str, int]] = []
+        for position, (item, item_names) in enumerate(items):
+            self.items.append(item)
+            for name in {normalize_name(x) for x in item_names}:
+                if not name:
+                    continue
+                names.append((name, position))
+                suffixes.extend((name[i:], position) for i in range(1, len(name)))
+        names.sort()
+        suffixes.sort()
+        self._names = [x[0] for x in names]
+        self._name_positions = [x[1] for x in names]
+        self._suffixes = [x[0] for x in suffixes]
+        self._suffix_positions = [x[1] for x in suffixes]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @staticmethod
+    def _starting_with(keys: list[str], text: str) -> range:
+        start = bisect.bisect_left(keys, text)
+        # the first string after all of those starting with `text`
+        end = bisect.bisect_left(keys, text + "\U0010ffff", start)
+        return range(start, end)
+
+    def search(self, text: str, limit: int = 25) -> list[T]:
+        """
+        Return the items having a name equal to `text`, then those with a name starting with
+        it, then those with a name containing it. If `text` is empty, the first items are
+        returned.
+        """
+        text = normalize_name(text)
+        if not text:
+            return self.items[:limit]
+
+        ranks: dict[int, int] = {}
+        for i in self._starting_with(self._names, text):
+            position = self._name_positions[i]
+            rank = 0 if self._names[i] == text else 1
+            ranks[position] = min(rank, ranks.get(position, rank))
+        if len(ranks) < limit:
+            for i in self._starting_with(self._suffixes, text):
+                ranks.setdefault(self._suffix_positions[i], 2)
+
+        best = sorted(ranks, key=lambda x: (ranks[x], x))[:limit]
+        return [self.items[x] for x in best]
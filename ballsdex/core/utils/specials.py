@@ -0,0 +1,83 @@
+import heapq
+import random
+from datetime import datetime, timedelta
+
+from tortoise.timezone import now as datetime_now
+
+from ballsdex.core.models import Special, cache_generation, specials
+from ballsdex.core.utils.sampling import AliasSampler
+
+
+class SpecialScheduler:
+    """
+    Keeps the special events running right now and the sampler used to pick the special of a
+    caught countryball.
+
+    Both are rebuilt only when an event starts or ends, found with a heap of the upcoming
+    start and end dates, or when the specials cache is reloaded. Between two boundaries,
+    reading them costs a comparison. The times given to the methods must never go backwards.
+    """
+
+    def __init__(self):
+        self._generation: int | None = None
+        # dates where the set of running events changes, the earliest first
+        self._boundaries: list[datetime] = []
+        self._active: list[Special] = []
+        self._sampler: AliasSampler[Special | None] | None = None
+
+    def _update(self, now: datetime):
+        generation = cache_generation()
+        if generation != self._generation:
+            self._generation = generation
+            self._boundaries = []
+            for special in specials.values():
+                if special.start_date > now:
+                    self._boundaries.append(special.start_date)
+                if special.end_date >= now:
+                    # an event is still running on its end date
+                    self._boundaries.append(special.end_date + timedelta(microseconds=1))
+            heapq.heapify(self._boundaries)
+        elif self._boundaries and self._boundaries[0] <= now:
+            while self._boundaries and self._boundaries[0] <= now:
+                heapq.heappop(self._boundaries)
+        else:
+            return
+
+        self._active = [x for x in specials.values() if x.start_date <= now <= x.end_date]
+        if self._active:
+            # the rarity is the chance of getting the event's card, the remaining chance
+            # (1 - rarity) of each event is summed into the chance of a common card
+            common_weight = sum(1 - x.rarity for x in self._active)
+            self._sampler = AliasSampler(
+                [*self._active, None], [x.rarity for x in self._active] + [common_weight]
+            )
+        else:
+            self._sampler = None
+
+    def active(self, now: datetime | None = None) -> list[Special]:
+        """
+        Return the special events running at this time, now by default.
+        """
+        self._update(now or datetime_now())
+        return self._active
+
+    def is_active(self, special: Special, now: datetime | None = None) -> bool:
+        """
+        Check if a special event is running at this time, now by default.
+        """
+        return special in self.active(now)
+
+    def pick(
+        self, rng: random.Random | None = None, now: datetime | None = None
+    ) -> Special | None:
+        """
+        Draw the special of a caught countryball among the running events, `None` for a common
+        card.
+        """
+        self._update(now or datetime_now())
+        if self._sampler is None:
+            return None
+        return self._sampler.sample(rng)
+
+
+special_scheduler = SpecialScheduler()
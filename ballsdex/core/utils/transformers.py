@@ -1,16 +1,15 @@
+import asyncio
 import logging
 import time
-from datetime import timedelta
 from enum import Enum
-from typing import TYPE_CHECKING, Generic, Iterable, Optional, TypeVar
+from typing import TYPE_CHECKING, Generic, Hashable, Iterable, Optional, TypeVar
 
 import discord
 from discord import app_commands
 from discord.interactions import Interaction
+from prometheus_client import Counter, Histogram
 from tortoise.exceptions import DoesNotExist
-from tortoise.expressions import Q, RawSQL
 from tortoise.models import Model
-from tortoise.timezone import now as tortoise_now
 
 from ballsdex.core.models import (
     Ball,
@@ -19,9 +18,15 @@ from ballsdex.core.models import (
     Regime,
     Special,
     balls,
+    cache_generation,
     economies,
     regimes,
+    specials,
 )
+from ballsdex.core.utils.catch_names import ball_names, get_catch_name_index
+from ballsdex.core.utils.inventory import search_inventory
+from ballsdex.core.utils.search import SearchIndex
+from ballsdex.core.utils.specials import special_scheduler
 from ballsdex.settings import settings
 
 if TYPE_CHECKING:
@@ -30,6 +35,24 @@ if TYPE_CHECKING:
 log = logging.getLogger("ballsdex.core.utils.transformers")
 T = TypeVar("T", bound=Model)
 
+autocomplete_time = Histogram(
+    "autocomplete_seconds",
+    "Time taken to generate autocompletion results",
+    ["transformer"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 2.5, 3.0, float("inf")),
+)
+autocomplete_results = Histogram(
+    "autocomplete_results",
+    "Number of autocompletion results sent",
+    ["transformer"],
+    buckets=(0, 1, 5, 10, 24, 25),
+)
+autocomplete_deadline_missed = Counter(
+    "autocomplete_deadline_missed",
+    "Autocompletions which sent partial results because of the deadline",
+    ["transformer"],
+)
+
 __all__ = (
     "BallTransform",
     "BallInstanceTransform",
@@ -109,17 +132,47 @@ class ModelTransformer(app_commands.Transformer, Generic[T]):
         """
         raise NotImplementedError()
 
+    async def collect_options(
+        self,
+        interaction: discord.Interaction["BallsDexBot"],
+        value: str,
+        choices: list[app_commands.Choice[int]],
+    ):
+        """
+        Add the options for autocompletion to `choices`, from `get_options` by default.
+
+        If the deadline is reached, the options added so far are sent. Override this to add them
+        as they are found.
+        """
+        choices.extend(await self.get_options(interaction, value))
+
     async def autocomplete(
         self, interaction: Interaction["BallsDexBot"], value: str
     ) -> list[app_commands.Choice[int]]:
-        t1 = time.time()
+        transformer = type(self).__name__
+        t1 = time.monotonic()
         choices: list[app_commands.Choice[int]] = []
-        for option in await self.get_options(interaction, value):
-            choices.append(option)
-        t2 = time.time()
+        # Discord ignores the results received too late, send what is ready before that. The
+        # budget starts now rather than at `interaction.created_at`, which uses Discord's clock
+        task = asyncio.create_task(self.collect_options(interaction, value, choices))
+        try:
+            done, _ = await asyncio.wait((task,), timeout=settings.autocomplete_deadline)
+        finally:
+            if not task.done():
+                task.cancel()
+        if task in done:
+            task.result()
+        else:
+            autocomplete_deadline_missed.labels(transformer=transformer).inc()
+        choices = choices[:25]
+        t2 = time.monotonic()
+
+        autocomplete_time.labels(transformer=transformer).observe(t2 - t1)
+        autocomplete_results.labels(transformer=transformer).observe(len(choices))
         log.debug(
             f"{self.name.title()} autocompletion took "
             f"{round((t2 - t1) * 1000)}ms, {len(choices)} results"
+            + ("" if task in done else " (deadline missed)")
         )
         return choices
 
@@ -161,42 +214,36 @@ class BallInstanceTransformer(ModelTransformer[BallInstance]):
     async def get_options(
         self, interaction: Interaction["BallsDexBot"], value: str
     ) -> list[app_commands.Choice[int]]:
-        balls_queryset = BallInstance.filter(player__discord_id=interaction.user.id)
+        choices: list[app_commands.Choice] = []
+        await self.collect_options(interaction, value, choices)
+        return choices
 
+    async def collect_options(
+        self,
+        interaction: discord.Interaction["BallsDexBot"],
+        value: str,
+        choices: list[app_commands.Choice[int]],
+    ):
+        special_id: int | None = None
         if (special := getattr(interaction.namespace, "special", None)) and special.isdigit():
-            balls_queryset = balls_queryset.filter(special_id=int(special))
-        if (shiny := getattr(interaction.namespace, "shiny", None)) and shiny is not None:
-            balls_queryset = balls_queryset.filter(shiny=shiny)
+            special_id = int(special)
+        shiny: bool | None = getattr(interaction.namespace, "shiny", None) or None
 
+        locked: bool | None = None
         if interaction.command and (trade_type := interaction.command.extras.get("trade", None)):
-            if trade_type == TradeCommandType.PICK:
-                balls_queryset = balls_queryset.filter(
-                    Q(
-                        Q(locked__isnull=True)
-                        | Q(locked__lt=tortoise_now() - timedelta(minutes=30))
-                    )
-                )
-            else:
-                balls_queryset = balls_queryset.filter(
-                    locked__isnull=False, locked__gt=tortoise_now() - timedelta(minutes=30)
-                )
-        balls_queryset = (
-            balls_queryset.select_related("ball")
-            .annotate(
-                searchable=RawSQL(
-                    "to_hex(ballinstance.id) || ' ' || ballinstance__ball.country || "
-                    "' ' || ballinstance__ball.catch_names"
+            locked = trade_type != TradeCommandType.PICK
+
+        # searched in memory, the inventory is only queried on the first keystroke. If that
+        # misses the deadline, the load continues in the background for the next keystrokes
+        instances = await search_inventory(
+            interaction.user.id, value, special_id=special_id, shiny=shiny, locked=locked
+        )
+        for instance in instances:
+            choices.append(
+                app_commands.Choice(
+                    name=instance.description(bot=interaction.client), value=str(instance.pk)
                 )
             )
-            .filter(searchable__icontains=value.replace(".", ""))
-            .limit(25)
-        )
-
-        choices: list[app_commands.Choice] = [
-            app_commands.Choice(name=x.description(bot=interaction.client), value=str(x.pk))
-            for x in await balls_queryset
-        ]
-        return choices
 
 
 class TTLModelTransformer(ModelTransformer[T]):
@@ -209,44 +256,78 @@ class TTLModelTransformer(ModelTransformer[T]):
     Attributes
     ----------
     ttl: float
-        Delay in seconds for `items` to live until refreshed with `load_items`, defaults to 300
+        Delay in seconds for `items` to live until refreshed with `load_items`, defaults to 300.
+        Not used if `version` is overridden.
     """
 
     ttl: float = 300
 
     def __init__(self):
         self.items: dict[int, T] = {}
-        self.search_map: dict[T, str] = {}
+        self.index: SearchIndex[T] = SearchIndex([])
         self.last_refresh: float = 0
+        self.last_version: Hashable | None = None
         log.debug(f"Inited transformer for {self.name}")
 
+    def version(self) -> Hashable | None:
+        """
+        Return a value which changes whenever `load_items` would return different items, or
+        `None` to refresh them every `ttl` seconds.
+        """
+        return None
+
+    def names(self, model: T) -> Iterable[str]:
+        """
+        Return the names an item can be searched with, its key by default.
+        """
+        return (self.key(model),)
+
     async def load_items(self) -> Iterable[T]:
         """
         Query values to fill `items` with.
         """
         return await self.model.all()
 
+    def is_stale(self) -> bool:
+        """
+        Whether `items` must be refreshed with `load_items`.
+        """
+        version = self.version()
+        if version is None:
+            return time.time() - self.last_refresh > self.ttl
+        return not self.last_refresh or version != self.last_version
+
     async def maybe_refresh(self):
+        if not self.is_stale():
+            return
         t = time.time()
-        if t - self.last_refresh > self.ttl:
-            self.items = {x.pk: x for x in await self.load_items()}
-            self.last_refresh = t
-            self.search_map = {x: self.key(x).lower() for x in self.items.values()}
+        version = self.version()
+        self.items = {x.pk: x for x in await self.load_items()}
+        self.last_refresh = t
+        self.last_version = version
+        self.index = SearchIndex((x, self.names(x)) for x in self.items.values())
 
     async def get_options(
         self, interaction: Interaction["BallsDexBot"], value: str
     ) -> list[app_commands.Choice[str]]:
         await self.maybe_refresh()
+        return [
+            app_commands.Choice(name=self.key(item), value=str(item.pk))
+            for item in self.index.search(value)
+        ]
 
-        i = 0
-        choices: list[app_commands.Choice] = []
-        for item in self.items.values():
-            if value.lower() in self.search_map[item]:
+    async def collect_options(
+        self,
+        interaction: discord.Interaction["BallsDexBot"],
+        value: str,
+        choices: list[app_commands.Choice[int]],
+    ):
+        if self.last_refresh and self.is_stale():
+            # the previous items are sent if refreshing them misses the deadline
+            for item in self.index.search(value):
                 choices.append(app_commands.Choice(name=self.key(item), value=str(item.pk)))
-                i += 1
-                if i == 25:
-                    break
-        return choices
+        options = await self.get_options(interaction, value)
+        choices[:] = options
 
 
 class BallTransformer(TTLModelTransformer[Ball]):
@@ -256,9 +337,29 @@ class BallTransformer(TTLModelTransformer[Ball]):
     def key(self, model: Ball) -> str:
         return model.country
 
+    def names(self, model: Ball) -> Iterable[str]:
+        return ball_names(model)
+
+    def version(self) -> Hashable | None:
+        return cache_generation()
+
     async def load_items(self) -> Iterable[Ball]:
         return balls.values()
 
+    async def get_options(
+        self, interaction: Interaction["BallsDexBot"], value: str
+    ) -> list[app_commands.Choice[str]]:
+        choices = await super().get_options(interaction, value)
+        if choices or not value.strip():
+            return choices
+
+        # nothing matches, suggest close names for typos
+        return [
+            app_commands.Choice(name=self.key(item), value=str(pk))
+            for pk in get_catch_name_index().suggest(value)
+            if (item := self.items.get(pk)) is not None
+        ]
+
 
 class BallEnabledTransformer(BallTransformer):
     async def load_items(self) -> Iterable[Ball]:
@@ -286,10 +387,24 @@ class SpecialTransformer(TTLModelTransformer[Special]):
     def key(self, model: Special) -> str:
         return model.name
 
+    def version(self) -> Hashable | None:
+        return cache_generation()
+
+    async def load_items(self) -> Iterable[Special]:
+        return specials.values()
+
 
 class SpecialEnabledTransformer(SpecialTransformer):
+    def version(self) -> Hashable | None:
+        # the order changes when an event starts or ends
+        return (cache_generation(), tuple(x.pk for x in special_scheduler.active()))
+
     async def load_items(self) -> Iterable[Special]:
-        return await Special.filter(hidden=False).all()
+        # read from the cache, running events are suggested first
+        active = special_scheduler.active()
+        return sorted(
+            (x for x in specials.values() if not x.hidden), key=lambda x: x not in active
+        )
 
 
 class RegimeTransformer(TTLModelTransformer[Regime]):
@@ -299,6 +414,9 @@ class RegimeTransformer(TTLModelTransformer[Regime]):
     def key(self, model: Regime) -> str:
         return model.name
 
+    def version(self) -> Hashable | None:
+        return cache_generation()
+
     async def load_items(self) -> Iterable[Regime]:
         return regimes.values()
 
@@ -310,6 +428,9 @@ class EconomyTransformer(TTLModelTransformer[Economy]):
     def key(self, model: Economy) -> str:
         return model.name
 
+    def version(self) -> Hashable | None:
+        return cache_generation()
+
     async def load_items(self) -> Iterable[Economy]:
         return economies.values()
 
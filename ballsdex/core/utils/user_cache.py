@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Iterable
+
+import discord
+from cachetools import LRUCache, TTLCache
+
+if TYPE_CHECKING:
+    from ballsdex.core.bot import BallsDexBot
+
+log = logging.getLogger("ballsdex.core.utils.user_cache")
+
+USER_CACHE_SIZE = 10_000
+# seconds after which a user is fetched again in the background, for name changes
+USER_TTL = 6 * 3600
+# seconds during which an unknown user ID isn't fetched again
+NOT_FOUND_TTL = 3600
+# users fetched at the same time by the background worker
+FETCH_CONCURRENCY = 4
+
+
+class UserCache:
+    """
+    Bounded cache of the Discord users fetched with the REST API, for displaying the names of
+    users which aren't in the gateway cache (leaderboard, trade history, original owners).
+
+    `get` never blocks: it checks the gateway cache then this one, and queues the missing or
+    stale users to be fetched in the background. Concurrent requests for the same user share a
+    single REST call.
+
+    Parameters
+    ----------
+    maxsize: int
+        Maximum number of users kept.
+    ttl: float
+        Seconds after which a cached user is still returned, but fetched again in the
+        background.
+    concurrency: int
+        Maximum number of REST calls made at the same time by the background worker.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = USER_CACHE_SIZE,
+        ttl: float = USER_TTL,
+        concurrency: int = FETCH_CONCURRENCY,
+    ):
+        self.bot: "BallsDexBot | None" = None
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self._users: LRUCache[int, tuple[float, discord.User]] = LRUCache(maxsize)
+        self._not_found: TTLCache[int, None] = TTLCache(maxsize, NOT_FOUND_TTL)
+        # users queued for the background worker, in order
+        self._pending: dict[int, None] = {}
+        self._inflight: dict[int, asyncio.Future[discord.User | None]] = {}
+        self._worker: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def configure(self, bot: "BallsDexBot"):
+        self.bot = bot
+
+    def get(self, user_id: int) -> discord.User | None:
+        """
+        Return a user without calling the API, `None` if it is not cached yet. Missing and
+        stale users are fetched in the background.
+        """
+        if self.bot is not None and (user := self.bot.get_user(user_id)) is not None:
+            return user
+        if (entry := self._users.get(user_id)) is None:
+            self.request((user_id,))
+            return None
+        fetched_at, user = entry
+        if time.monotonic() - fetched_at > self.ttl:
+            self.request((user_id,))
+        return user
+
+    def name(self, user_id: int, default: str | None = None) -> str:
+        """
+        Return the name of a user without calling the API, `default` if it is not cached yet.
+        """
+        if (user := self.get(user_id)) is not None:
+            return user.name
+        return default or f"user with ID {user_id}"
+
+    def is_not_found(self, user_id: int) -> bool:
+        """
+        Return whether this user was recently found not to exist, meaning `fetch` won't call the
+        API for it.
+        """
+        return user_id in self._not_found
+
+    def request(self, user_ids: Iterable[int]):
+        """
+        Queue users to be fetched in the background, if they aren't cached or are stale. The
+        worker fetches them in batches of `concurrency` calls.
+        """
+        now = time.monotonic()
+        for user_id in user_ids:
+            if user_id in self._inflight or user_id in self._not_found:
+                continue
+            if (entry := self._users.get(user_id)) and now - entry[0] <= self.ttl:
+                continue
+            if self.bot is not None and self.bot.get_user(user_id) is not None:
+                continue
+            self._pending[user_id] = None
+        if self._pending and (self._worker is None or self._worker.done()):
+            self._worker = asyncio.create_task(self._work())
+
+    async def fetch(self, user_id: int) -> discord.User | None:
+        """
+        Return a user, fetching it if it is not cached. If the user is already being fetched,
+        that call is awaited instead of making a new one. `None` is returned if the user
+        doesn't exist or the call failed.
+        """
+        if (user := self.get(user_id)) is not None:
+            return user
+        if user_id in self._not_found:
+            return None
+        self._pending.pop(user_id, None)
+        return await asyncio.shield(self._start(user_id))
+
+    def _start(self, user_id: int) -> asyncio.Future[discord.User | None]:
+        if (future := self._inflight.get(user_id)) is None:
+            future = self._inflight[user_id] = asyncio.ensure_future(self._fetch(user_id))
+            future.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        return future
+
+    async def _fetch(self, user_id: int) -> discord.User | None:
+        if self.bot is None:
+            raise RuntimeError("The user cache is not configured")
+        try:
+            user = await self.bot.fetch_user(user_id)
+        except discord.NotFound:
+            self._not_found[user_id] = None
+            return None
+        except discord.HTTPException:
+            log.warning(f"Failed to fetch user {user_id}", exc_info=True)
+            return None
+        self._users[user_id] = (time.monotonic(), user)
+        return user
+
+    async def _work(self):
+        while self._pending:
+            batch = list(self._pending)[: self.concurrency]
+            for user_id in batch:
+                del self._pending[user_id]
+            await asyncio.gather(*(self._start(x) for x in batch), return_exceptions=True)
+
+
+user_cache = UserCache()
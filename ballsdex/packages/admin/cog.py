@@ -33,6 +33,7 @@ from ballsdex.core.utils.enums import (
     MENTION_POLICY_MAP,
     PRIVATE_POLICY_MAP,
 )
+from ballsdex.core.utils.inventory import inventory_index
 from ballsdex.core.utils.logging import log_action
 from ballsdex.core.utils.paginator import FieldPageSource, Pages, TextPageSource
 from ballsdex.core.utils.transformers import (
@@ -50,6 +51,7 @@ from ballsdex.settings import settings
 if TYPE_CHECKING:
     from ballsdex.core.bot import BallsDexBot
     from ballsdex.packages.countryballs.cog import CountryBallsSpawner
+    from ballsdex.packages.countryballs.dispatcher import SpawnDispatcher
 
 log = logging.getLogger("ballsdex.packages.admin.cog")
 FILENAME_RE = re.compile(r"^(.+)(\.\S+)$")
@@ -246,19 +248,13 @@ class Admin(commands.GroupCog):
         penalities: list[str] = []
         if guild.member_count < 5 or guild.member_count > 1000:
             penalities.append("Server has less than 5 or more than 1000 members")
-        if any(len(x.content) < 5 for x in cooldown.message_cache):
+        if cooldown.message_cache.short_messages:
             penalities.append("Some cached messages are less than 5 characters long")
 
-        authors_set = set(x.author_id for x in cooldown.message_cache)
-        low_chatters = len(authors_set) < 4
+        low_chatters = cooldown.message_cache.unique_authors < 4
         # check if one author has more than 40% of messages in cache
         major_chatter = any(
-            (
-                len(list(filter(lambda x: x.author_id == author, cooldown.message_cache)))
-                / cooldown.message_cache.maxlen  # type: ignore
-                > 0.4
-            )
-            for author in authors_set
+            cooldown.message_cache.share(author) > 0.4 for author in cooldown.message_cache.authors
         )
         # this mess is needed since either conditions make up to a single penality
         if low_chatters:
@@ -294,7 +290,7 @@ class Admin(commands.GroupCog):
         )
 
         informations: list[str] = []
-        if cooldown.lock.locked():
+        if spawn_manager.limiter.is_limited(guild.id, interaction.created_at):
             informations.append("The manager is currently on cooldown.")
         if delta < 600:
             informations.append(
@@ -422,6 +418,11 @@ class Admin(commands.GroupCog):
         )
         await pages.start(ephemeral=True)
 
+    def _get_spawn_dispatcher(self) -> "SpawnDispatcher":
+        return cast(
+            "CountryBallsSpawner", self.bot.get_cog("CountryBallsSpawner")
+        ).spawn_manager.dispatcher
+
     async def _spawn_bomb(
         self,
         interaction: discord.Interaction,
@@ -450,22 +451,28 @@ class Admin(commands.GroupCog):
         )
         task = self.bot.loop.create_task(update_message_loop())
         try:
-            for i in range(n):
-                if not countryball:
-                    ball = await CountryBall.get_random()
-                else:
-                    ball = CountryBall(countryball)
-                result = await ball.spawn(channel)
-                if not result:
-                    task.cancel()
-                    await interaction.followup.edit_message(
-                        "@original",  # type: ignore
-                        content=f"A {settings.collectible_name} failed to spawn, probably "
-                        "indicating a lack of permissions to send messages "
-                        f"or upload files in {channel.mention}.",
-                    )
-                    return
-                spawned += 1
+            if not countryball:
+                to_spawn = await CountryBall.get_random_many(n)
+            else:
+                to_spawn = [CountryBall(countryball) for _ in range(n)]
+            dispatcher = self._get_spawn_dispatcher()
+            # uploads are pipelined by the dispatcher, queue them all then wait for them
+            futures = [await dispatcher.enqueue(ball, channel) for ball in to_spawn]
+            try:
+                for future in asyncio.as_completed(futures):
+                    if not await future:
+                        task.cancel()
+                        await interaction.followup.edit_message(
+                            "@original",  # type: ignore
+                            content=f"A {settings.collectible_name} failed to spawn, probably "
+                            "indicating a lack of permissions to send messages "
+                            f"or upload files in {channel.mention}.",
+                        )
+                        return
+                    spawned += 1
+            finally:
+                for future in futures:
+                    future.cancel()
             task.cancel()
             await interaction.followup.edit_message(
                 "@original",  # type: ignore
@@ -531,7 +538,10 @@ class Admin(commands.GroupCog):
             ball = await CountryBall.get_random()
         else:
             ball = CountryBall(countryball)
-        result = await ball.spawn(channel or interaction.channel)  # type: ignore
+        future = await self._get_spawn_dispatcher().enqueue(
+            ball, channel or interaction.channel  # type: ignore
+        )
+        result = await future
 
         if result:
             await interaction.followup.send(
@@ -1183,6 +1193,8 @@ class Admin(commands.GroupCog):
             count = len(to_delete)
         else:
             count = await BallInstance.filter(player=player).delete()
+            # bulk deletions don't send the signals keeping the inventory index current
+            inventory_index.invalidate(player.pk)
         await interaction.followup.send(
             f"{count} {settings.plural_collectible_name} from {user} have been deleted.",
             ephemeral=True,
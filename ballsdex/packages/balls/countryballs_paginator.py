@@ -63,6 +63,6 @@ class CountryballsSelector(Pages):
 
 class CountryballsViewer(CountryballsSelector):
     async def ball_selected(self, interaction: discord.Interaction, ball_instance: BallInstance):
-        content, file = await ball_instance.prepare_for_message(interaction)
+        content, file = await ball_instance.prepare_for_message(interaction, preview=True)
         await interaction.followup.send(content=content, file=file)
         file.close()
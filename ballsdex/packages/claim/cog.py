@@ -172,7 +172,7 @@ class Claim(commands.Cog):
         
         await interaction.response.defer(thinking=True)
         num_monsters = 3 if random.random() < 0.1 else 2
-        cobs = [await CountryBall.get_random() for _ in range(num_monsters)]
+        cobs = await CountryBall.get_random_many(num_monsters)
         await self.give_monster(interaction, cobs, "boost")
     
     @app_commands.command(name="staffclaim", description="Claim one or two random monsters - made by Venus")
@@ -211,7 +211,7 @@ class Claim(commands.Cog):
         
         await interaction.response.defer(thinking=True)
         num_monsters = 2 if random.random() < 0.45 else 1
-        cobs = [await CountryBall.get_random() for _ in range(num_monsters)]
+        cobs = await CountryBall.get_random_many(num_monsters)
         await self.give_monster(interaction, cobs, "staff")
 
 async def setup(bot):
@@ -0,0 +1,134 @@
+import logging
+import math
+from collections import Counter, deque
+from dataclasses import dataclass
+from datetime import datetime
+
+from prometheus_client import REGISTRY
+from prometheus_client import Counter as PrometheusCounter
+
+from ballsdex.core.models import CatchEvent, specials
+
+log = logging.getLogger("ballsdex.packages.countryballs.catch_events")
+
+# labels are limited to values with a small, fixed number of possibilities: there is one
+# special per event and the guild sizes are powers of 10
+if "caught_cb" not in REGISTRY._names_to_collectors:
+    caught_balls = PrometheusCounter(
+        "caught_cb", "Caught countryballs", ["shiny", "special", "guild_size"]
+    )
+else:
+    caught_balls = REGISTRY._names_to_collectors["caught_cb"]
+if "caught_cb_dropped" not in REGISTRY._names_to_collectors:
+    dropped_events = PrometheusCounter(
+        "caught_cb_dropped", "Catch events dropped because the buffer was full"
+    )
+else:
+    dropped_events = REGISTRY._names_to_collectors["caught_cb_dropped"]
+
+
+@dataclass(slots=True)
+class PendingCatch:
+    ball_id: int
+    player_id: int
+    guild_id: int | None
+    shiny: bool
+    special_id: int | None
+    guild_size: int | None
+    spawned_at: datetime | None
+    caught_at: datetime
+
+
+def guild_size_bucket(member_count: int | None) -> str:
+    """
+    Round the size of a server to the nearest power of 10 above it.
+    """
+    if not member_count:
+        return "unknown"
+    return str(10 ** math.ceil(math.log(max(member_count - 1, 1), 10)))
+
+
+class CatchEventBuffer:
+    """
+    Ring buffer of the recent catches, flushed periodically.
+
+    Recording a catch only appends to the buffer. On flush, the catches are aggregated into the
+    Prometheus counters (one increment per label combination instead of one per catch) and, if
+    enabled, inserted in the `CatchEvent` table with a single bulk query. If the buffer is full,
+    the oldest catches are dropped and counted in `caught_cb_dropped`.
+
+    Parameters
+    ----------
+    maxlen: int
+        Maximum number of catches kept between two flushes.
+    store: bool
+        Whether the catches are also written to the database.
+    """
+
+    def __init__(self, maxlen: int = 10_000, store: bool = False):
+        self.store = store
+        self._events: deque[PendingCatch] = deque(maxlen=maxlen)
+        # catches already counted in the metrics, but which failed to be written
+        self._unsaved: list[PendingCatch] = []
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def configure(self, maxlen: int, store: bool):
+        self.store = store
+        self._events = deque(self._events, maxlen=maxlen)
+
+    def record(self, event: PendingCatch):
+        if len(self._events) == self._events.maxlen:
+            dropped_events.inc()
+        self._events.append(event)
+
+    async def flush(self) -> int:
+        """
+        Aggregate the buffered catches into the metrics and write them to the database if
+        enabled. If writing fails, the rows are written again with the next flush (up to the
+        size of the buffer), without being counted twice in the metrics.
+
+        Returns
+        -------
+        int
+            The number of catches flushed.
+        """
+        events = list(self._events)
+        self._events.clear()
+
+        counts: Counter[tuple[bool, str, str]] = Counter()
+        for event in events:
+            # same label values as before the aggregation, "None" for common cards
+            special = str(specials.get(event.special_id)) if event.special_id else "None"
+            counts[(event.shiny, special, guild_size_bucket(event.guild_size))] += 1
+        for (shiny, special, guild_size), count in counts.items():
+            caught_balls.labels(shiny=shiny, special=special, guild_size=guild_size).inc(count)
+
+        if self.store and (self._unsaved or events):
+            events = self._unsaved + events
+            self._unsaved = []
+            try:
+                await CatchEvent.bulk_create(
+                    [
+                        CatchEvent(
+                            ball_id=x.ball_id,
+                            player_id=x.player_id,
+                            guild_id=x.guild_id,
+                            shiny=x.shiny,
+                            special_id=x.special_id,
+                            guild_size=x.guild_size,
+                            spawned_at=x.spawned_at,
+                            caught_at=x.caught_at,
+                        )
+                        for x in events
+                    ],
+                    batch_size=1000,
+                )
+            except Exception:
+                self._unsaved = events[-(self._events.maxlen or len(events)) :]
+                raise
+        return len(events)
+
+
+catch_events = CatchEventBuffer()
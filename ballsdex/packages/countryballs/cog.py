@@ -2,26 +2,31 @@ import logging
 from typing import TYPE_CHECKING, Optional
 
 import discord
-from discord.ext import commands
-from tortoise.exceptions import DoesNotExist
+from discord.ext import commands, tasks
 
-from ballsdex.core.models import GuildConfig
+from ballsdex.core.utils.guild_config import guild_configs
+from ballsdex.packages.countryballs.catch_events import catch_events
 from ballsdex.packages.countryballs.spawn import SpawnManager
+from ballsdex.settings import settings
 
 if TYPE_CHECKING:
     from ballsdex.core.bot import BallsDexBot
 
 log = logging.getLogger("ballsdex.packages.countryballs")
 
+# how often the spawn progress of the guilds is saved
+SAVE_INTERVAL = 60
+
 
 class CountryBallsSpawner(commands.Cog):
     def __init__(self, bot: "BallsDexBot"):
         self.spawn_manager = SpawnManager()
         self.bot = bot
+        catch_events.configure(settings.catch_events_buffer_size, settings.catch_events_store)
 
     async def load_cache(self):
         i = 0
-        async for config in GuildConfig.all():
+        for config in guild_configs.values():
             if not config.enabled:
                 continue
             if not config.spawn_channel:
@@ -31,6 +36,46 @@ class CountryBallsSpawner(commands.Cog):
         grammar = "" if i == 1 else "s"
         log.info(f"Loaded {i} guild{grammar} in cache.")
 
+        restored = await self.spawn_manager.load_state()
+        log.info(f"Restored the spawn progress of {restored} guilds.")
+        if not self.save_spawn_state.is_running():
+            self.save_spawn_state.start()
+        if not self.flush_catch_events.is_running():
+            self.flush_catch_events.start()
+
+    async def cog_unload(self):
+        self.save_spawn_state.cancel()
+        self.flush_catch_events.cancel()
+        self.spawn_manager.dispatcher.close()
+        try:
+            await catch_events.flush()
+        except Exception:
+            log.error("Failed to flush the catch events", exc_info=True)
+        try:
+            await self.spawn_manager.save_state()
+        except Exception:
+            log.error("Failed to save the spawn progress", exc_info=True)
+
+    @tasks.loop(seconds=SAVE_INTERVAL)
+    async def save_spawn_state(self):
+        try:
+            saved = await self.spawn_manager.save_state()
+        except Exception:
+            log.error("Failed to save the spawn progress", exc_info=True)
+        else:
+            if saved:
+                log.debug(f"Saved the spawn progress of {saved} guilds.")
+
+    @tasks.loop(seconds=settings.catch_events_interval)
+    async def flush_catch_events(self):
+        try:
+            flushed = await catch_events.flush()
+        except Exception:
+            log.error("Failed to flush the catch events", exc_info=True)
+        else:
+            if flushed:
+                log.debug(f"Flushed {flushed} catch events.")
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         if message.author.bot:
@@ -57,12 +102,11 @@ class CountryBallsSpawner(commands.Cog):
             if channel:
                 self.spawn_manager.cache[guild.id] = channel.id
             else:
-                try:
-                    config = await GuildConfig.get(guild_id=guild.id)
-                except DoesNotExist:
+                # not read from the cache, the bot may not have reloaded this config yet
+                config = await guild_configs.refresh(guild.id)
+                if config is None:
                     return
-                else:
-                    self.spawn_manager.cache[guild.id] = config.spawn_channel
+                self.spawn_manager.cache[guild.id] = config.spawn_channel
         else:
             if enabled is False:
                 del self.spawn_manager.cache[guild.id]
@@ -1,17 +1,18 @@
 from __future__ import annotations
 
 import logging
-import math
 import random
 from typing import TYPE_CHECKING, cast
-from prometheus_client import Counter, REGISTRY
 
 import discord
 from discord.ui import Button, Modal, TextInput, View
-from tortoise.exceptions import DoesNotExist
-from tortoise.timezone import now as datetime_now
+from tortoise.transactions import in_transaction
 
-from ballsdex.core.models import BallInstance, GuildConfig, Player, specials
+from ballsdex.core.models import BallInstance, Player
+from ballsdex.core.utils.catch_names import get_catch_name_index
+from ballsdex.core.utils.guild_config import guild_configs
+from ballsdex.core.utils.specials import special_scheduler
+from ballsdex.packages.countryballs.catch_events import PendingCatch, catch_events
 from ballsdex.settings import settings
 
 if TYPE_CHECKING:
@@ -20,12 +21,26 @@ if TYPE_CHECKING:
     from ballsdex.packages.countryballs.countryball import CountryBall
 
 log = logging.getLogger("ballsdex.packages.countryballs.components")
-if 'caught_cb' not in REGISTRY._names_to_collectors:
-    caught_balls = Counter(
-        "caught_cb", "Caught countryballs", ["country", "shiny", "special", "guild_size"]
-    )
-else:
-    caught_balls = REGISTRY._names_to_collectors['caught_cb']
+
+# insert the caught instance and tell if it's the first of this ball for the player in the same
+# statement, the other instances are found with the (player_id, ball_id) index
+CATCH_QUERY = """
+INSERT INTO "ballinstance" AS i ("ball_id", "player_id", "shiny", "special_id", "attack_bonus",
+    "health_bonus", "server_id", "spawned_time")
+VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+RETURNING i.*, NOT EXISTS (
+    SELECT 1 FROM "ballinstance" b
+    WHERE b."player_id" = $2 AND b."ball_id" = $1 AND b."id" <> i."id"
+) AS "is_new"
+"""
+
+
+async def allowed_mentions(user_id: int) -> discord.AllowedMentions:
+    """
+    Return the mentions allowed by the policy of a player, without creating it.
+    """
+    player = await Player.get_or_none(discord_id=user_id)
+    return discord.AllowedMentions(users=player is None or player.can_be_mentioned)
 
 
 class CountryballNamePrompt(Modal, title=f"Catch this {settings.collectible_name}!"):
@@ -41,51 +56,45 @@ class CountryballNamePrompt(Modal, title=f"Catch this {settings.collectible_name
         self.button = button
 
     async def on_error(self, interaction: discord.Interaction, error: Exception, /) -> None:
-        try:
-            config = await GuildConfig.get(guild_id=interaction.guild_id)
-        except DoesNotExist:
-            config = await GuildConfig.create(guild_id=interaction.guild_id, spawn_channel=None)
+        silent = guild_configs.is_silent(interaction.guild_id)
         log.exception("An error occured in countryball catching prompt", exc_info=error)
         if interaction.response.is_done():
             await interaction.followup.send(
                 f"An error occured with this {settings.collectible_name}.",
-                ephemeral=config.silent,
+                ephemeral=silent,
             )
         else:
             await interaction.response.send_message(
                 f"An error occured with this {settings.collectible_name}.",
-                ephemeral=config.silent,
+                ephemeral=silent,
             )
 
     async def on_submit(self, interaction: discord.Interaction["BallsDexBot"]):
         await interaction.response.defer(thinking=True)
 
-        player, _ = await Player.get_or_create(discord_id=interaction.user.id)
-        try:
-            config = await GuildConfig.get(guild_id=interaction.guild_id)
-        except DoesNotExist:
-            config = await GuildConfig.create(guild_id=interaction.guild_id, spawn_channel=None)
-
         if self.ball.catched:
             await interaction.followup.send(
                 f"{interaction.user.mention} I was caught already!",
-                ephemeral=config.silent,
-                allowed_mentions=discord.AllowedMentions(users=player.can_be_mentioned),
+                ephemeral=guild_configs.is_silent(interaction.guild_id),
+                allowed_mentions=await allowed_mentions(interaction.user.id),
             )
             return
 
-        if self.ball.model.catch_names:
-            possible_names = (self.ball.name.lower(), *self.ball.model.catch_names.split(";"))
-        else:
-            possible_names = (self.ball.name.lower(),)
-        if self.ball.model.translations:
-            possible_names += tuple(x.lower() for x in self.ball.model.translations.split(";"))
-
-        if self.name.value.lower().strip() in possible_names:
-            self.ball.catched = True
-            ball, has_caught_before = await self.catch_ball(
-                interaction.client, cast(discord.Member, interaction.user)
-            )
+        if get_catch_name_index().matches(self.ball.model, self.name.value):
+            if not self.ball.claim():
+                await interaction.followup.send(
+                    f"{interaction.user.mention} I was caught already!",
+                    ephemeral=guild_configs.is_silent(interaction.guild_id),
+                    allowed_mentions=await allowed_mentions(interaction.user.id),
+                )
+                return
+            try:
+                ball, has_caught_before = await self.catch_ball(
+                    interaction.client, cast(discord.Member, interaction.user)
+                )
+            except Exception:
+                self.ball.release()
+                raise
 
             special = ""
             if ball.shiny:
@@ -101,7 +110,7 @@ class CountryballNamePrompt(Modal, title=f"Catch this {settings.collectible_name
                 f"{interaction.user.mention} You caught **{self.ball.name}!** "
                 f"`(#{ball.pk:0X}, {ball.attack_bonus:+}%/{ball.health_bonus:+}%)`\n\n"
                 f"{special}",
-                allowed_mentions=discord.AllowedMentions(users=player.can_be_mentioned),
+                allowed_mentions=discord.AllowedMentions(users=ball.player.can_be_mentioned),
             )
             self.button.disabled = True
             await interaction.followup.edit_message(self.ball.message.id, view=self.button.view)
@@ -111,7 +120,23 @@ class CountryballNamePrompt(Modal, title=f"Catch this {settings.collectible_name
     async def catch_ball(
         self, bot: "BallsDexBot", user: discord.Member
     ) -> tuple[BallInstance, bool]:
-        player, created = await Player.get_or_create(discord_id=user.id)
+        """
+        Create the caught instance. The player is fetched or created in the same transaction
+        as the instance, which is inserted by a single statement also telling if it's the first
+        of this countryball for the player.
+
+        Parameters
+        ----------
+        bot: BallsDexBot
+            The bot instance.
+        user: discord.Member
+            The member who caught the countryball.
+
+        Returns
+        -------
+        tuple[BallInstance, bool]
+            The created instance, and whether it's the first of this countryball for the player.
+        """
 
         # stat may vary by +/- 20% of base stat
         bonus_attack = random.randint(-settings.max_attack_bonus, settings.max_attack_bonus)
@@ -120,48 +145,50 @@ class CountryballNamePrompt(Modal, title=f"Catch this {settings.collectible_name
 
         # check if we can spawn cards with a special background
         special: "Special | None" = None
-        population = [x for x in specials.values() if x.start_date <= datetime_now() <= x.end_date]
-        if not shiny and population:
-            # Here we try to determine what should be the chance of having a common card
-            # since the rarity field is a value between 0 and 1, 1 being no common
-            # and 0 only common, we get the remaining value by doing (1-rarity)
-            # We then sum each value for each current event, and we should get an algorithm
-            # that kinda makes sense.
-            common_weight = sum(1 - x.rarity for x in population)
-
-            weights = [x.rarity for x in population] + [common_weight]
-            # None is added representing the common countryball
-            special = random.choices(population=population + [None], weights=weights, k=1)[0]
-
-        is_new = not await BallInstance.filter(player=player, ball=self.ball.model).exists()
-        ball = await BallInstance.create(
-            ball=self.ball.model,
-            player=player,
-            shiny=shiny,
-            special=special,
-            attack_bonus=bonus_attack,
-            health_bonus=bonus_health,
-            server_id=user.guild.id,
-            spawned_time=self.ball.time,
-        )
+        if not shiny:
+            special = special_scheduler.pick()
+
+        async with in_transaction() as connection:
+            player, _ = await Player.get_or_create(discord_id=user.id, using_db=connection)
+            _, rows = await connection.execute_query(
+                CATCH_QUERY,
+                [
+                    self.ball.model.pk,
+                    player.pk,
+                    shiny,
+                    special.pk if special else None,
+                    bonus_attack,
+                    bonus_health,
+                    user.guild.id,
+                    self.ball.time,
+                ],
+            )
+            row = dict(rows[0])
+            is_new = row.pop("is_new")
+            ball = BallInstance._init_from_db(**row)
+            ball.ball = self.ball.model
+            ball.player = player
+            ball.special = special
+            # the row wasn't inserted by save(), run its listeners (inventory index)
+            await ball._post_save(connection, created=True)
         if user.id in bot.catch_log:
             log.info(
                 f"{user} caught {settings.collectible_name}"
                 f" {self.ball.model}, {shiny=} {special=}",
             )
-        else:
-            log.debug(
-                f"{user} caught {settings.collectible_name}"
-                f" {self.ball.model}, {shiny=} {special=}",
-            )
-        if user.guild.member_count:
-            caught_balls.labels(
-                country=self.ball.model.country,
+        # counted in the metrics and stored in batches by the countryballs cog
+        catch_events.record(
+            PendingCatch(
+                ball_id=self.ball.model.pk,
+                player_id=user.id,
+                guild_id=user.guild.id,
                 shiny=shiny,
-                special=special,
-                # observe the size of the server, rounded to the nearest power of 10
-                guild_size=10 ** math.ceil(math.log(max(user.guild.member_count - 1, 1), 10)),
-            ).inc()
+                special_id=special.pk if special else None,
+                guild_size=user.guild.member_count,
+                spawned_at=self.ball.time,
+                caught_at=ball.catch_date,
+            )
+        )
         return ball, is_new
 
 
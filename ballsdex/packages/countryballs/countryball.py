@@ -5,12 +5,33 @@ from datetime import datetime
 
 import discord
 
-from ballsdex.core.models import Ball, balls
+from ballsdex.core.image_generator.assets import asset_store
+from ballsdex.core.models import Ball, balls, cache_generation
+from ballsdex.core.utils.sampling import AliasSampler
 from ballsdex.packages.countryballs.components import CatchView
 from ballsdex.settings import settings
 
 log = logging.getLogger("ballsdex.packages.countryballs")
 
+# sampler of the enabled balls weighted by rarity, with the cache generation it was built from
+_sampler: tuple[int, AliasSampler[Ball] | None] | None = None
+
+
+def get_sampler() -> AliasSampler[Ball] | None:
+    """
+    Return the sampler of enabled balls, rebuilt only when the balls cache is reloaded.
+    `None` is returned if no ball can spawn.
+    """
+    global _sampler
+    generation = cache_generation()
+    if _sampler is None or _sampler[0] != generation:
+        countryballs = [x for x in balls.values() if x.enabled and x.rarity > 0]
+        sampler = None
+        if countryballs:
+            sampler = AliasSampler(countryballs, [x.rarity for x in countryballs])
+        _sampler = (generation, sampler)
+    return _sampler[1]
+
 
 class CountryBall:
     def __init__(self, model: Ball):
@@ -22,28 +43,56 @@ class CountryBall:
 
     @classmethod
     async def get_random(cls):
-        countryballs = list(filter(lambda m: m.enabled, balls.values()))
-        if not countryballs:
-            raise RuntimeError("No ball to spawn")
-        rarities = [x.rarity for x in countryballs]
-        cb = random.choices(population=countryballs, weights=rarities, k=1)[0]
-        return cls(cb)
+        return (await cls.get_random_many(1))[0]
 
-    async def spawn(self, channel: discord.TextChannel) -> bool:
+    @classmethod
+    async def get_random_many(cls, k: int) -> list["CountryBall"]:
         """
-        Spawn a countryball in a channel.
+        Draw `k` random balls weighted by rarity, with replacement.
+        """
+        sampler = get_sampler()
+        if sampler is None:
+            raise RuntimeError("No ball to spawn")
+        return [cls(x) for x in sampler.sample_many(k)]
 
-        Parameters
-        ----------
-        channel: discord.TextChannel
-            The channel where to spawn the countryball. Must have permission to send messages
-            and upload files as a bot (not through interactions).
+    def claim(self) -> bool:
+        """
+        Mark this countryball as caught. Only the first call succeeds until `release` is
+        called, so concurrent correct guesses cannot both create an instance.
 
         Returns
         -------
         bool
-            `True` if the operation succeeded, otherwise `False`. An error will be displayed
-            in the logs if that's the case.
+            `True` if the caller now owns the catch, `False` if it was already caught.
+        """
+        if self.catched:
+            return False
+        self.catched = True
+        return True
+
+    def release(self):
+        """
+        Make this countryball catchable again after a failed catch.
+        """
+        self.catched = False
+
+    @staticmethod
+    def can_spawn(channel: discord.TextChannel) -> bool:
+        """
+        Check if the bot has the permissions to spawn in this channel.
+        """
+        permissions = channel.permissions_for(channel.guild.me)
+        return permissions.attach_files and permissions.send_messages
+
+    async def send(self, channel: discord.TextChannel) -> discord.Message:
+        """
+        Send the spawn message in a channel, without handling errors. Spawns should go through
+        the `SpawnDispatcher`, which retries and logs the failures.
+
+        Raises
+        ------
+        discord.HTTPException
+            Sending the message failed.
         """
 
         def generate_random_name():
@@ -53,19 +102,9 @@ class CountryBall:
         extension = self.model.wild_card.split(".")[-1]
         file_location = "." + self.model.wild_card
         file_name = f"nt_{generate_random_name()}.{extension}"
-        try:
-            permissions = channel.permissions_for(channel.guild.me)
-            if permissions.attach_files and permissions.send_messages:
-                self.message = await channel.send(
-                    f"A wild {settings.collectible_name} appeared!",
-                    view=CatchView(self),
-                    file=discord.File(file_location, filename=file_name),
-                )
-                return True
-            else:
-                log.error("Missing permission to spawn ball in channel %s.", channel)
-        except discord.Forbidden:
-            log.error(f"Missing permission to spawn ball in channel {channel}.")
-        except discord.HTTPException:
-            log.error("Failed to spawn ball", exc_info=True)
-        return False
+        self.message = await channel.send(
+            f"A wild {settings.collectible_name} appeared!",
+            view=CatchView(self),
+            file=discord.File(asset_store.open(file_location), filename=file_name),
+        )
+        return self.message
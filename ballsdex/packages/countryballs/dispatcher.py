@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+
+import discord
+from prometheus_client import REGISTRY, Histogram
+
+from ballsdex.packages.countryballs.countryball import CountryBall
+
+log = logging.getLogger("ballsdex.packages.countryballs.dispatcher")
+
+# the package can be reloaded, the metrics must only be registered once
+if "spawn_queue_seconds" not in REGISTRY._names_to_collectors:
+    spawn_queue_time = Histogram(
+        "spawn_queue_seconds", "Time spent by spawns waiting to be sent", ["kind"]
+    )
+else:
+    spawn_queue_time = REGISTRY._names_to_collectors["spawn_queue_seconds"]
+if "spawn_upload_seconds" not in REGISTRY._names_to_collectors:
+    spawn_upload_time = Histogram("spawn_upload_seconds", "Time taken to send a spawn", ["result"])
+else:
+    spawn_upload_time = REGISTRY._names_to_collectors["spawn_upload_seconds"]
+
+# seconds after which the workers of an inactive channel are stopped
+IDLE_TIMEOUT = 60
+# maximum delay between two attempts
+MAX_BACKOFF = 30
+
+
+def retry_delay(error: discord.HTTPException, attempt: int) -> float:
+    """
+    Return the delay before a new attempt: the one given by Discord in the `Retry-After`
+    header if any, otherwise an exponential backoff.
+    """
+    headers = getattr(error.response, "headers", None) or {}
+    try:
+        delay = float(headers["Retry-After"])
+    except (KeyError, TypeError, ValueError):
+        delay = 2**attempt
+    return min(delay, MAX_BACKOFF)
+
+
+@dataclass
+class SpawnJob:
+    ball: CountryBall
+    channel: discord.TextChannel
+    future: asyncio.Future[bool]
+    kind: str = "natural"
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class _ChannelQueue:
+    queue: asyncio.Queue[SpawnJob]
+    workers: set[asyncio.Task] = field(default_factory=set)
+
+
+class SpawnDispatcher:
+    """
+    Sends spawns in the background, so that handling messages and commands never waits for
+    an upload.
+
+    Each channel has a bounded queue consumed by up to `channel_concurrency` workers, so
+    consecutive spawns in a channel are pipelined while a slow or rate-limited channel only
+    delays itself. The number of uploads running at the same time across all channels is
+    capped by `max_concurrency`. Failed uploads are retried when Discord reports a
+    rate-limit or a server error, waiting for the delay of the `Retry-After` header if any.
+    A spawn waiting to be retried doesn't count against `max_concurrency`.
+
+    Attributes
+    ----------
+    max_concurrency: int
+        Maximum number of spawns being sent at the same time.
+    channel_concurrency: int
+        Maximum number of spawns being sent at the same time in a single channel.
+    queue_size: int
+        Maximum number of spawns waiting in each channel. Natural spawns are dropped when the
+        queue is full.
+    max_retries: int
+        Number of new attempts after a rate-limit or a server error.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        channel_concurrency: int = 2,
+        queue_size: int = 10,
+        max_retries: int = 3,
+    ):
+        self.max_concurrency = max_concurrency
+        self.channel_concurrency = channel_concurrency
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._channels: dict[int, _ChannelQueue] = {}
+
+    def _get_queue(self, channel: discord.TextChannel) -> _ChannelQueue:
+        if (channel_queue := self._channels.get(channel.id)) is None:
+            channel_queue = _ChannelQueue(asyncio.Queue(self.queue_size))
+            self._channels[channel.id] = channel_queue
+        return channel_queue
+
+    def _start_workers(self, channel_id: int, channel_queue: _ChannelQueue):
+        while len(channel_queue.workers) < self.channel_concurrency:
+            task = asyncio.create_task(self._worker(channel_id, channel_queue))
+            channel_queue.workers.add(task)
+
+    def submit(
+        self, ball: CountryBall, channel: discord.TextChannel, *, kind: str = "natural"
+    ) -> asyncio.Future[bool]:
+        """
+        Queue a spawn without waiting. If the queue of the channel is full, the spawn is
+        dropped and the returned future is already resolved to `False`.
+
+        Parameters
+        ----------
+        ball: CountryBall
+            The ball to spawn.
+        channel: discord.TextChannel
+            The channel where the ball spawns.
+        kind: str
+            Label of the spawn in the metrics.
+
+        Returns
+        -------
+        asyncio.Future[bool]
+            Resolved to `True` once the ball is sent, or `False` if it failed. Cancelling it
+            removes the spawn from the queue.
+        """
+        future: asyncio.Future[bool] = asyncio.get_running_loop().create_future()
+        channel_queue = self._get_queue(channel)
+        try:
+            channel_queue.queue.put_nowait(SpawnJob(ball, channel, future, kind))
+        except asyncio.QueueFull:
+            log.warning(f"Spawn queue of channel {channel.id} is full, dropping a spawn.")
+            future.set_result(False)
+        else:
+            self._start_workers(channel.id, channel_queue)
+        return future
+
+    async def enqueue(
+        self, ball: CountryBall, channel: discord.TextChannel, *, kind: str = "command"
+    ) -> asyncio.Future[bool]:
+        """
+        Queue a spawn, waiting for room in the queue of the channel if needed.
+        See `submit` for the parameters.
+        """
+        future: asyncio.Future[bool] = asyncio.get_running_loop().create_future()
+        channel_queue = self._get_queue(channel)
+        await channel_queue.queue.put(SpawnJob(ball, channel, future, kind))
+        self._start_workers(channel.id, channel_queue)
+        return future
+
+    async def _worker(self, channel_id: int, channel_queue: _ChannelQueue):
+        queue = channel_queue.queue
+        try:
+            while True:
+                try:
+                    job = await asyncio.wait_for(queue.get(), timeout=IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    if queue.empty():
+                        return
+                    continue
+                try:
+                    if job.future.done():  # cancelled by the caller
+                        continue
+                    spawn_queue_time.labels(kind=job.kind).observe(
+                        time.monotonic() - job.queued_at
+                    )
+                    result = await self._deliver(job)
+                    if not job.future.done():
+                        job.future.set_result(result)
+                except asyncio.CancelledError:
+                    job.future.cancel()
+                    raise
+                except Exception as e:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                finally:
+                    queue.task_done()
+        finally:
+            channel_queue.workers.discard(asyncio.current_task())  # type: ignore
+            if not channel_queue.workers:
+                if queue.empty():
+                    if self._channels.get(channel_id) is channel_queue:
+                        del self._channels[channel_id]
+                else:
+                    # a spawn was queued while this worker was stopping
+                    self._start_workers(channel_id, channel_queue)
+
+    async def _deliver(self, job: SpawnJob) -> bool:
+        if not CountryBall.can_spawn(job.channel):
+            log.error(f"Missing permission to spawn ball in channel {job.channel}.")
+            spawn_upload_time.labels(result="forbidden").observe(0)
+            return False
+        for attempt in range(self.max_retries + 1):
+            try:
+                # the slot is only held during an attempt, not while waiting to retry
+                async with self._slots:
+                    start = time.monotonic()
+                    await job.ball.send(job.channel)
+            except discord.Forbidden:
+                spawn_upload_time.labels(result="forbidden").observe(time.monotonic() - start)
+                log.error(f"Missing permission to spawn ball in channel {job.channel}.")
+                return False
+            except discord.HTTPException as e:
+                spawn_upload_time.labels(result="error").observe(time.monotonic() - start)
+                if (e.status != 429 and e.status < 500) or attempt == self.max_retries:
+                    log.error("Failed to spawn ball", exc_info=True)
+                    return False
+                delay = retry_delay(e, attempt)
+                log.warning(
+                    f"Failed to spawn ball in channel {job.channel.id} ({e.status}), "
+                    f"retrying in {delay:.1f}s."
+                )
+                await asyncio.sleep(delay)
+            else:
+                spawn_upload_time.labels(result="success").observe(time.monotonic() - start)
+                return True
+        return False
+
+    def close(self):
+        """
+        Stop all the workers. Queued spawns are resolved to `False`, spawns being sent are
+        cancelled.
+        """
+        for channel_queue in list(self._channels.values()):
+            for task in channel_queue.workers:
+                task.cancel()
+            while not channel_queue.queue.empty():
+                job = channel_queue.queue.get_nowait()
+                if not job.future.done():
+                    job.future.set_result(False)
+        self._channels.clear()
@@ -0,0 +1,277 @@
+"""
+Replay message streams through the spawn system, without Discord or a database.
+
+Synthetic streams are generated from guild profiles (member count, number of active chatters,
+activity), or recorded streams can be replayed from a JSON lines file where each line looks like
+`{"time": 1700000000.0, "guild_id": 1, "member_count": 120, "author_id": 5, "length": 32}`.
+
+Spawns per guild per hour and the CPU cost of handling each message are reported.
+
+Run with `python -m ballsdex.packages.countryballs.simulation --help`.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Iterable, Iterator
+
+from ballsdex.core.utils.sampling import AliasSampler
+from ballsdex.packages.countryballs.spawn import SpawnManager
+
+# member count ranges with their share of guilds, roughly following the bot's population
+GUILD_SIZES = (((2, 4), 0.1), ((5, 99), 0.55), ((100, 999), 0.3), ((1000, 50000), 0.05))
+SIZE_BUCKETS = ("1-4", "5-99", "100-999", "1000+")
+
+
+class FakeGuild:
+    __slots__ = ("id", "member_count")
+
+    def __init__(self, id: int, member_count: int):
+        self.id = id
+        self.member_count = member_count
+
+
+class FakeAuthor:
+    __slots__ = ("id", "bot")
+
+    def __init__(self, id: int):
+        self.id = id
+        self.bot = False
+
+
+class FakeMessage:
+    """
+    The attributes of `discord.Message` read by the spawn system.
+    """
+
+    __slots__ = ("guild", "author", "content", "created_at")
+
+    def __init__(self, guild: FakeGuild, author: FakeAuthor, content: str, created_at: datetime):
+        self.guild = guild
+        self.author = author
+        self.content = content
+        self.created_at = created_at
+
+
+@dataclass
+class GuildProfile:
+    guild: FakeGuild
+    chatters: list[FakeAuthor]
+    activity: float
+
+    @property
+    def size_bucket(self) -> str:
+        member_count = self.guild.member_count
+        if member_count < 5:
+            return "1-4"
+        if member_count < 100:
+            return "5-99"
+        if member_count < 1000:
+            return "100-999"
+        return "1000+"
+
+
+class SimulatedSpawnManager(SpawnManager):
+    """
+    Spawn manager recording spawns instead of sending them.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.spawns: defaultdict[int, int] = defaultdict(int)
+
+    async def spawn_countryball(self, guild):
+        self.spawns[guild.id] += 1
+
+
+@dataclass
+class SimulationResult:
+    messages: int
+    hours: float
+    cpu_time: float
+    profiles: dict[int, GuildProfile]
+    spawns: dict[int, int] = field(default_factory=dict)
+
+    def spawn_rates(self, bucket: str | None = None) -> list[float]:
+        return [
+            self.spawns.get(guild_id, 0) / self.hours
+            for guild_id, profile in self.profiles.items()
+            if bucket is None or profile.size_bucket == bucket
+        ]
+
+
+_contents: dict[int, str] = {}
+
+
+def _content(length: int) -> str:
+    # only the length of the messages is read, the same strings are reused
+    if (content := _contents.get(length)) is None:
+        content = _contents[length] = "a" * length
+    return content
+
+
+def generate_profiles(count: int, rng: random.Random) -> dict[int, GuildProfile]:
+    """
+    Create guilds with random sizes, numbers of chatters and activity.
+    """
+    sizes = AliasSampler([x[0] for x in GUILD_SIZES], [x[1] for x in GUILD_SIZES])
+    profiles: dict[int, GuildProfile] = {}
+    for guild_id in range(1, count + 1):
+        low, high = sizes.sample(rng)
+        member_count = rng.randint(low, high)
+        chatters = max(1, min(member_count, int(rng.paretovariate(1.2) * 2)))
+        profiles[guild_id] = GuildProfile(
+            FakeGuild(guild_id, member_count),
+            [FakeAuthor(guild_id * 100_000 + i) for i in range(chatters)],
+            # a few guilds send most of the messages
+            activity=rng.lognormvariate(0, 1.5),
+        )
+    return profiles
+
+
+def synthetic_stream(
+    profiles: dict[int, GuildProfile], messages: int, hours: float, rng: random.Random
+) -> Iterator[FakeMessage]:
+    """
+    Generate messages spread over `hours`, in chronological order. Guilds are picked according
+    to their activity, authors favor the first chatters of each guild and message lengths
+    follow an exponential distribution.
+    """
+    guilds = AliasSampler(list(profiles.values()), [x.activity for x in profiles.values()])
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+    duration = hours * 3600
+    for timestamp in sorted(rng.random() * duration for _ in range(messages)):
+        profile = guilds.sample(rng)
+        author = profile.chatters[int(len(profile.chatters) * rng.random() ** 2)]
+        yield FakeMessage(
+            profile.guild,
+            author,
+            _content(min(2000, int(rng.expovariate(1 / 40)))),
+            datetime.fromtimestamp(start + timestamp, timezone.utc),
+        )
+
+
+def recorded_stream(
+    lines: Iterable[str], profiles: dict[int, GuildProfile]
+) -> Iterator[FakeMessage]:
+    """
+    Read messages from JSON lines, filling `profiles` with the guilds encountered. Messages
+    must be in chronological order.
+    """
+    authors: dict[int, FakeAuthor] = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        data = json.loads(line)
+        profile = profiles.get(data["guild_id"])
+        if profile is None:
+            guild = FakeGuild(data["guild_id"], data["member_count"])
+            profile = profiles[guild.id] = GuildProfile(guild, [], 1)
+        if (author := authors.get(data["author_id"])) is None:
+            author = authors[data["author_id"]] = FakeAuthor(data["author_id"])
+            profile.chatters.append(author)
+        yield FakeMessage(
+            profile.guild,
+            author,
+            _content(data["length"]),
+            datetime.fromtimestamp(data["time"], timezone.utc),
+        )
+
+
+async def simulate(
+    stream: Iterable[FakeMessage], profiles: dict[int, GuildProfile], hours: float | None = None
+) -> SimulationResult:
+    """
+    Feed a message stream to a spawn manager and collect the spawns.
+
+    Parameters
+    ----------
+    stream: Iterable[FakeMessage]
+        The messages, in chronological order.
+    profiles: dict[int, GuildProfile]
+        The guilds of the stream. They are all considered to have a spawn channel.
+    hours: float | None
+        Duration covered by the stream. If `None`, the time between the first and last messages
+        is used.
+
+    Returns
+    -------
+    SimulationResult
+        The number of spawns per guild and the CPU time spent in the spawn manager.
+    """
+    manager = SimulatedSpawnManager()
+    handle_message = manager.handle_message
+    count = 0
+    cpu_time = 0.0
+    first = last = None
+    for message in stream:
+        # the channel is only read by spawn_countryball, which is replaced
+        manager.cache.setdefault(message.guild.id, 0)
+        start = time.process_time()
+        await handle_message(message)  # type: ignore
+        cpu_time += time.process_time() - start
+        count += 1
+        first = first or message.created_at
+        last = message.created_at
+    if hours is None:
+        hours = (last - first).total_seconds() / 3600 if first and last else 0
+    return SimulationResult(count, max(hours, 1 / 3600), cpu_time, profiles, dict(manager.spawns))
+
+
+def print_report(result: SimulationResult):
+    per_message = result.cpu_time / result.messages * 1e6 if result.messages else 0
+    print(
+        f"{result.messages} messages in {len(result.profiles)} guilds over {result.hours:.1f}h, "
+        f"{sum(result.spawns.values())} spawns"
+    )
+    print(f"CPU time in the spawn manager: {result.cpu_time:.2f}s ({per_message:.2f}µs/message)")
+    print()
+    print(f"{'members':<10}{'guilds':>8}{'mean/h':>10}{'p50/h':>10}{'p99/h':>10}{'max/h':>10}")
+    for bucket in (*SIZE_BUCKETS, None):
+        rates = result.spawn_rates(bucket)
+        if not rates:
+            continue
+        p99 = statistics.quantiles(rates, n=100)[98] if len(rates) > 1 else rates[0]
+        print(
+            f"{bucket or 'all':<10}{len(rates):>8}{statistics.mean(rates):>10.3f}"
+            f"{statistics.median(rates):>10.3f}{p99:>10.3f}{max(rates):>10.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--guilds", "-g", type=int, default=10_000, help="Number of guilds")
+    parser.add_argument("--messages", "-m", type=int, default=1_000_000, help="Number of messages")
+    parser.add_argument(
+        "--hours", type=float, default=24, help="Duration covered by the synthetic stream"
+    )
+    parser.add_argument(
+        "--replay", metavar="FILE", help="Replay a recorded JSON lines stream instead"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random generators")
+    args = parser.parse_args()
+
+    # the spawn system uses the global generator for the spawn thresholds
+    random.seed(args.seed)
+    rng = random.Random(args.seed)
+    if args.replay:
+        profiles: dict[int, GuildProfile] = {}
+        with open(args.replay) as file:
+            result = asyncio.run(simulate(recorded_stream(file, profiles), profiles))
+    else:
+        profiles = generate_profiles(args.guilds, rng)
+        stream = synthetic_stream(profiles, args.messages, args.hours, rng)
+        result = asyncio.run(simulate(stream, profiles, args.hours))
+    print_report(result)
+
+
+if __name__ == "__main__":
+    main()
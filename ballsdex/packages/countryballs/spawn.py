@@ -1,20 +1,109 @@
-import asyncio
 import logging
 import random
-from collections import deque, namedtuple
+from collections import Counter, deque, namedtuple
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import cast
 
 import discord
 
+from ballsdex.core.models import SpawnState
 from ballsdex.packages.countryballs.countryball import CountryBall
+from ballsdex.packages.countryballs.dispatcher import SpawnDispatcher
 
 log = logging.getLogger("ballsdex.packages.countryballs")
 
 SPAWN_CHANCE_RANGE = (15, 20)
 
-CachedMessage = namedtuple("CachedMessage", ["content", "author_id"])
+SHORT_MESSAGE_LENGTH = 5
+# number of increases between two cleanups of the expired cooldowns
+PRUNE_INTERVAL = 10_000
+
+CachedMessage = namedtuple("CachedMessage", ["length", "author_id"])
+
+
+@dataclass
+class ChatterStats:
+    """
+    Rolling window of the most recent messages in a guild. The number of messages per author
+    and the number of short messages are kept up to date as messages enter and leave the
+    window, so every update and lookup is O(1).
+
+    Attributes
+    ----------
+    maxlen: int
+        Number of messages in the window.
+    messages: ~collections.deque[CachedMessage]
+        The messages in the window, only their length and author are stored.
+    authors: ~collections.Counter[int]
+        Number of messages in the window per author ID. Authors without messages are removed.
+    short_messages: int
+        Number of messages shorter than `SHORT_MESSAGE_LENGTH` in the window.
+    """
+
+    maxlen: int = 100
+    messages: deque[CachedMessage] = field(init=False)
+    authors: Counter[int] = field(default_factory=Counter, init=False)
+    short_messages: int = field(default=0, init=False)
+
+    def __post_init__(self):
+        self.messages = deque(maxlen=self.maxlen)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def append(self, message: CachedMessage):
+        if len(self.messages) == self.maxlen:
+            self._forget(self.messages[0])
+        # the deque drops the oldest message by itself
+        self.messages.append(message)
+        self.authors[message.author_id] += 1
+        if message.length < SHORT_MESSAGE_LENGTH:
+            self.short_messages += 1
+
+    def _forget(self, message: CachedMessage):
+        count = self.authors[message.author_id] - 1
+        if count:
+            self.authors[message.author_id] = count
+        else:
+            del self.authors[message.author_id]
+        if message.length < SHORT_MESSAGE_LENGTH:
+            self.short_messages -= 1
+
+    def dump(self) -> dict[str, list[int]]:
+        """
+        Return a compact representation of the window, for persistence. Authors are stored
+        once, and each message as `author index * 2 + short flag`.
+        """
+        authors = list(self.authors)
+        index = {author_id: i for i, author_id in enumerate(authors)}
+        messages = [
+            index[x.author_id] * 2 + (x.length < SHORT_MESSAGE_LENGTH) for x in self.messages
+        ]
+        return {"authors": authors, "messages": messages}
+
+    @classmethod
+    def load(cls, data: dict[str, list[int]], maxlen: int = 100) -> "ChatterStats":
+        """
+        Restore a window saved with `dump`. Message lengths are only known to be short or not.
+        """
+        stats = cls(maxlen)
+        authors = data.get("authors", [])
+        for value in data.get("messages", []):
+            author, short = divmod(value, 2)
+            length = 0 if short else SHORT_MESSAGE_LENGTH
+            stats.append(CachedMessage(length=length, author_id=authors[author]))
+        return stats
+
+    @property
+    def unique_authors(self) -> int:
+        return len(self.authors)
+
+    def share(self, author_id: int) -> float:
+        """
+        Return the part of the full window occupied by messages from this author.
+        """
+        return self.authors[author_id] / self.maxlen
 
 
 @dataclass
@@ -32,61 +121,171 @@ class SpawnCooldown:
         point, a ball will be spawned next.
     chance: int
         The number `amount` has to reach for spawn. Determined randomly with `SPAWN_CHANCE_RANGE`
-    lock: asyncio.Lock
-        Used to ratelimit messages and ignore fast spam
-    message_cache: ~collections.deque[CachedMessage]
-        A list of recent messages used to reduce the spawn chance when too few different chatters
-        are present. Limited to the 100 most recent messages in the guild.
+    message_cache: ChatterStats
+        Statistics of recent messages used to reduce the spawn chance when too few different
+        chatters are present. Limited to the 100 most recent messages in the guild.
     """
 
     time: datetime
     # initialize partially started, to reduce the dead time after starting the bot
     amount: float = field(default=SPAWN_CHANCE_RANGE[0] // 2)
     chance: int = field(default_factory=lambda: random.randint(*SPAWN_CHANCE_RANGE))
-    lock: asyncio.Lock = field(default_factory=asyncio.Lock, init=False)
-    message_cache: deque[CachedMessage] = field(default_factory=lambda: deque(maxlen=100))
+    message_cache: ChatterStats = field(default_factory=ChatterStats)
 
     def reset(self, time: datetime):
         self.amount = 1.0
         self.chance = random.randint(*SPAWN_CHANCE_RANGE)
-        try:
-            self.lock.release()
-        except RuntimeError:  # lock is not acquired
-            pass
         self.time = time
 
-    async def increase(self, message: discord.Message) -> bool:
-        # this is a deque, not a list
-        # its property is that, once the max length is reached (100 for us),
-        # the oldest element is removed, thus we only have the last 100 messages in memory
+    def record(self, message: discord.Message):
+        # once the max length is reached (100 for us), the oldest message is removed,
+        # thus we only have the stats of the last 100 messages in memory
         self.message_cache.append(
-            CachedMessage(content=message.content, author_id=message.author.id)
+            CachedMessage(length=len(message.content), author_id=message.author.id)
         )
 
-        if self.lock.locked():
-            return False
+    def increase(self, message: discord.Message):
+        amount = 1
+        if message.guild.member_count < 5 or message.guild.member_count > 1000:  # type: ignore
+            amount /= 2
+        if len(message.content) < SHORT_MESSAGE_LENGTH:
+            amount /= 2
+        if (
+            self.message_cache.unique_authors < 4
+            or self.message_cache.share(message.author.id) > 0.4
+        ):
+            amount /= 2
+        self.amount += amount
 
-        async with self.lock:
-            amount = 1
-            if message.guild.member_count < 5 or message.guild.member_count > 1000:  # type: ignore
-                amount /= 2
-            if len(message.content) < 5:
-                amount /= 2
-            if len(set(x.author_id for x in self.message_cache)) < 4 or (
-                len(list(filter(lambda x: x.author_id == message.author.id, self.message_cache)))
-                / self.message_cache.maxlen  # type: ignore
-                > 0.4
-            ):
-                amount /= 2
-            self.amount += amount
-            await asyncio.sleep(10)
+
+@dataclass
+class SpawnRateLimiter:
+    """
+    Limits how often the spawn progress of each guild can increase, to ignore fast spam.
+
+    Instead of holding a lock and sleeping for every guild, the time at which each guild can
+    increase again is stored, and messages are compared against it. Times come from the
+    messages themselves, nothing is scheduled on the event loop.
+
+    Attributes
+    ----------
+    interval: float
+        Minimum number of seconds between two increases in the same guild.
+    next_eligible: dict[int, float]
+        Timestamp from which each guild can increase again. Expired entries are pruned from
+        time to time.
+    """
+
+    interval: float = 10
+    next_eligible: dict[int, float] = field(default_factory=dict)
+    _calls: int = field(default=0, init=False)
+
+    def is_limited(self, guild_id: int, time: datetime) -> bool:
+        """
+        Check if the guild is on cooldown at the given time, without modifying it.
+        """
+        return self.next_eligible.get(guild_id, 0) > time.timestamp()
+
+    def acquire(self, guild_id: int, time: datetime) -> bool:
+        """
+        Start the cooldown of the guild if it's not already running.
+
+        Parameters
+        ----------
+        guild_id: int
+            The guild where the message was sent.
+        time: datetime
+            The time of the message.
+
+        Returns
+        -------
+        bool
+            `True` if the guild can increase, else `False`.
+        """
+        timestamp = time.timestamp()
+        if self.next_eligible.get(guild_id, 0) > timestamp:
+            return False
+        self.next_eligible[guild_id] = timestamp + self.interval
+        self._calls += 1
+        if self._calls >= PRUNE_INTERVAL:
+            self.prune(timestamp)
         return True
 
+    def reset(self, guild_id: int):
+        """
+        End the cooldown of the guild.
+        """
+        self.next_eligible.pop(guild_id, None)
+
+    def prune(self, timestamp: float):
+        """
+        Remove the guilds whose cooldown ended before the given timestamp.
+        """
+        self._calls = 0
+        self.next_eligible = {k: v for k, v in self.next_eligible.items() if v > timestamp}
+
 
 @dataclass
 class SpawnManager:
     cooldowns: dict[int, SpawnCooldown] = field(default_factory=dict)
     cache: dict[int, int] = field(default_factory=dict)
+    limiter: SpawnRateLimiter = field(default_factory=SpawnRateLimiter)
+    # guilds whose cooldown changed since the last save
+    dirty: set[int] = field(default_factory=set)
+    dispatcher: SpawnDispatcher = field(default_factory=SpawnDispatcher)
+
+    async def load_state(self) -> int:
+        """
+        Restore the cooldowns saved in the database.
+
+        Returns
+        -------
+        int
+            The number of cooldowns restored.
+        """
+        i = 0
+        async for state in SpawnState.all():
+            cooldown = SpawnCooldown(state.time, amount=state.amount, chance=state.chance)
+            cooldown.message_cache = ChatterStats.load(state.chatters)
+            self.cooldowns[state.guild_id] = cooldown
+            i += 1
+        return i
+
+    async def save_state(self) -> int:
+        """
+        Save the cooldowns modified since the last call, in a single bulk upsert.
+
+        Returns
+        -------
+        int
+            The number of cooldowns saved.
+        """
+        if not self.dirty:
+            return 0
+        dirty, self.dirty = self.dirty, set()
+        states = [
+            SpawnState(
+                guild_id=guild_id,
+                amount=cooldown.amount,
+                chance=cooldown.chance,
+                time=cooldown.time,
+                chatters=cooldown.message_cache.dump(),
+            )
+            for guild_id in dirty
+            if (cooldown := self.cooldowns.get(guild_id))
+        ]
+        try:
+            await SpawnState.bulk_create(
+                states,
+                batch_size=1000,
+                on_conflict=("guild_id",),
+                update_fields=("amount", "chance", "time", "chatters", "updated_at"),
+            )
+        except Exception:
+            # try again on the next call
+            self.dirty |= dirty
+            raise
+        return len(states)
 
     async def handle_message(self, message: discord.Message):
         guild = message.guild
@@ -112,9 +311,12 @@ class SpawnManager:
             multiplier = 0.8
         chance = cooldown.chance - multiplier * (delta // 60)
 
-        # manager cannot be increased more than once per 5 seconds
-        if not await cooldown.increase(message):
+        cooldown.record(message)
+        self.dirty.add(guild.id)
+        # manager cannot be increased more than once per 10 seconds
+        if not self.limiter.acquire(guild.id, message.created_at):
             return
+        cooldown.increase(message)
 
         # normal increase, need to reach goal
         if cooldown.amount <= chance:
@@ -127,6 +329,7 @@ class SpawnManager:
 
         # spawn countryball
         cooldown.reset(message.created_at)
+        self.limiter.reset(guild.id)
         await self.spawn_countryball(guild)
 
     async def spawn_countryball(self, guild: discord.Guild):
@@ -136,4 +339,5 @@ class SpawnManager:
             del self.cache[guild.id]
             return
         ball = await CountryBall.get_random()
-        await ball.spawn(cast(discord.TextChannel, channel))
+        # sent in the background, handling messages must not wait for the upload
+        self.dispatcher.submit(ball, cast(discord.TextChannel, channel))
@@ -1,16 +1,21 @@
 import discord
 from discord import app_commands
-from discord.ext import commands
-from tortoise.functions import Count
-from tortoise.expressions import Q
+from discord.ext import commands, tasks
 from typing import List, Tuple
-import asyncio
+import logging
 import time
 
-from ballsdex.core.models import Player, BallInstance
+from ballsdex.core.models import PlayerStats
 from ballsdex.core.utils.paginator import FieldPageSource, Pages
+from ballsdex.core.utils.user_cache import user_cache
+from ballsdex.packages.leaderboard.stats import StatsRepairer
 from ballsdex.settings import settings
 
+log = logging.getLogger("ballsdex.packages.leaderboard")
+
+# how often a batch of player statistics is reconciled with the instances
+REPAIR_INTERVAL = 60
+
 class Leaderboard(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -19,16 +24,46 @@ class Leaderboard(commands.Cog):
             "shiny": []
         }
         self.last_update = 0
+        self.repairer = StatsRepairer()
+
+    async def cog_load(self):
+        self.repair_stats.start()
+
+    async def cog_unload(self):
+        self.repair_stats.cancel()
+
+    @tasks.loop(seconds=REPAIR_INTERVAL)
+    async def repair_stats(self):
+        try:
+            await self.repairer.repair()
+        except Exception:
+            log.error("Failed to repair the player statistics", exc_info=True)
 
     async def update_leaderboard_cache(self):
-        all_players = await Player.all().annotate(monster_count=Count('balls')).order_by('-monster_count').limit(50)
-        shiny_players = await Player.all().annotate(
-            shiny_count=Count('balls', _filter=Q(balls__shiny=True))
-        ).filter(shiny_count__gt=0).order_by('-shiny_count').limit(50)
+        # indexed reads of the counters maintained by the database
+        all_players = (
+            await PlayerStats.filter(total__gt=0)
+            .order_by("-total")
+            .limit(50)
+            .values_list("player__discord_id", "total")
+        )
+        shiny_players = (
+            await PlayerStats.filter(shiny__gt=0)
+            .order_by("-shiny")
+            .limit(50)
+            .values_list("player__discord_id", "shiny")
+        )
 
-        self.leaderboard_cache["all"] = [(int(player.discord_id), player.monster_count) for player in all_players]
-        self.leaderboard_cache["shiny"] = [(int(player.discord_id), player.shiny_count) for player in shiny_players]
+        self.leaderboard_cache["all"] = [
+            (int(discord_id), count) for discord_id, count in all_players
+        ]
+        self.leaderboard_cache["shiny"] = [
+            (int(discord_id), count) for discord_id, count in shiny_players
+        ]
         self.last_update = time.time()
+        user_cache.request(
+            discord_id for entries in self.leaderboard_cache.values() for discord_id, _ in entries
+        )
 
     @app_commands.command()
     @app_commands.checks.cooldown(1, 10)
@@ -68,31 +103,16 @@ class Leaderboard(commands.Cog):
             leaderboard_data = list(reversed(leaderboard_data))
 
         entries = []
-        user_ids_to_fetch = []
-
         for index, (discord_id, monster_count) in enumerate(leaderboard_data, start=1):
             if shiny_only and monster_count == 0:
                 continue
-            user = self.bot.get_user(discord_id)
-            if user:
-                username = user.name
-            else:
-                username = f"Unknown User ({discord_id})"
-                user_ids_to_fetch.append(discord_id)
-            
+            # names not cached yet are fetched in the background for the next invocations
+            username = user_cache.name(discord_id, f"Unknown User ({discord_id})")
             entries.append((
                 f"{index}. {username}",
                 f"{monster_count} {'shiny ' if shiny_only else ''}{settings.collectible_name}s"
             ))
 
-        if user_ids_to_fetch:
-            fetched_users = await asyncio.gather(*[self.bot.fetch_user(uid) for uid in user_ids_to_fetch])
-            for user in fetched_users:
-                for i, (entry_title, entry_value) in enumerate(entries):
-                    if f"Unknown User ({user.id})" in entry_title:
-                        entries[i] = (entry_title.replace(f"Unknown User ({user.id})", user.name), entry_value)
-                        break
-
         source = FieldPageSource(entries, per_page=10)
         
         title_parts = ["FanmadeDex Leaderboard ("]
@@ -109,9 +129,5 @@ class Leaderboard(commands.Cog):
         pages = Pages(source=source, interaction=interaction, compact=True)
         await pages.start()
 
-    @commands.Cog.listener()
-    async def on_ballsdex_settings_change(self, guild: discord.Guild, channel: discord.TextChannel | None = None, enabled: bool | None = None):
-        await self.update_leaderboard_cache()
-
 def setup(bot):
     bot.add_cog(Leaderboard(bot))
@@ -0,0 +1,71 @@
+import logging
+
+from tortoise import Tortoise
+
+log = logging.getLogger("ballsdex.packages.leaderboard.stats")
+
+# recount the instances of the next players after the given player ID, and fix the counters
+# which drifted (concurrent transactions can count a ball as new twice)
+REPAIR_QUERY = """
+WITH players AS (
+    SELECT "id" FROM "player" WHERE "id" > $1 ORDER BY "id" LIMIT $2
+), actual AS (
+    SELECT p."id" AS "player_id", COUNT(b."id") AS "total",
+        COUNT(b."id") FILTER (WHERE b."shiny") AS "shiny", COUNT(b."special_id") AS "special",
+        COUNT(DISTINCT b."ball_id") AS "distinct_balls"
+    FROM players p LEFT JOIN "ballinstance" b ON b."player_id" = p."id"
+    GROUP BY p."id"
+), fixed AS (
+    INSERT INTO "playerstats" AS s ("player_id", "total", "shiny", "special", "distinct_balls")
+    SELECT * FROM actual a
+    WHERE a."total" > 0 OR EXISTS (SELECT 1 FROM "playerstats" WHERE "player_id" = a."player_id")
+    ON CONFLICT ("player_id") DO UPDATE SET
+        "total" = EXCLUDED."total",
+        "shiny" = EXCLUDED."shiny",
+        "special" = EXCLUDED."special",
+        "distinct_balls" = EXCLUDED."distinct_balls"
+    WHERE (s."total", s."shiny", s."special", s."distinct_balls")
+        IS DISTINCT FROM (EXCLUDED."total", EXCLUDED."shiny", EXCLUDED."special",
+            EXCLUDED."distinct_balls")
+    RETURNING s."player_id"
+)
+SELECT (SELECT MAX("id") FROM players) AS "last_id", (SELECT COUNT(*) FROM fixed) AS "fixed"
+"""
+
+
+class StatsRepairer:
+    """
+    Reconcile the `playerstats` counters with the instances, a batch of players at a time.
+
+    The counters are maintained by database triggers, this only fixes the drift. Each call
+    recounts the instances of the next `batch_size` players, starting over from the first
+    player once all have been checked, so the cost of a call doesn't grow with the number of
+    instances.
+
+    Parameters
+    ----------
+    batch_size: int
+        Number of players checked per call.
+    """
+
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+        self.last_id = 0
+
+    async def repair(self) -> int:
+        """
+        Check the next batch of players.
+
+        Returns
+        -------
+        int
+            The number of players whose counters were fixed.
+        """
+        connection = Tortoise.get_connection("default")
+        _, rows = await connection.execute_query(REPAIR_QUERY, [self.last_id, self.batch_size])
+        last_id, fixed = rows[0]["last_id"], rows[0]["fixed"]
+        # no player after the last one, start over
+        self.last_id = last_id or 0
+        if fixed:
+            log.info(f"Fixed the statistics of {fixed} players.")
+        return fixed
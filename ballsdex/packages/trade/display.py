@@ -5,6 +5,7 @@ import discord
 from ballsdex.core.models import Trade as TradeModel
 from ballsdex.core.utils import menus
 from ballsdex.core.utils.paginator import Pages
+from ballsdex.core.utils.user_cache import user_cache
 from ballsdex.packages.trade.trade_user import TradingUser
 
 if TYPE_CHECKING:
@@ -25,6 +26,12 @@ class TradeViewFormat(menus.ListPageSource):
         super().__init__(entries, per_page=1)
 
     async def format_page(self, menu: Pages, trade: TradeModel) -> discord.Embed:
+        # fetch the names of the traders of this page and the next one in the background
+        user_cache.request(
+            int(player.discord_id)
+            for entry in self.entries[menu.current_page : menu.current_page + 2]
+            for player in (entry.player1, entry.player2)
+        )
         embed = discord.Embed(
             title=f"Trade history for {self.header}",
             description=f"Trade ID: {trade.pk:0X}",
@@ -1,6 +1,8 @@
 from dataclasses import dataclass, field
 from typing import TYPE_CHECKING
 
+from ballsdex.core.utils.user_cache import user_cache
+
 if TYPE_CHECKING:
     import discord
 
@@ -20,5 +22,11 @@ class TradingUser:
     @classmethod
     async def from_trade_model(cls, trade: "Trade", player: "Player", bot: "BallsDexBot"):
         proposal = await trade.tradeobjects.filter(player=player).prefetch_related("ballinstance")
-        user = await bot.fetch_user(player.discord_id)
+        # shares the call with the names requested in the background by the history view
+        user = await user_cache.fetch(player.discord_id)
+        if user is None:
+            if user_cache.is_not_found(player.discord_id):
+                raise LookupError(f"Discord user {player.discord_id} does not exist")
+            # the cached call failed, a new one raises the error
+            user = await bot.fetch_user(player.discord_id)
         return cls(user, player, [x.ballinstance for x in proposal])
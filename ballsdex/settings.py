@@ -1,6 +1,6 @@
 import logging
 from dataclasses import dataclass, field
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 import yaml
 
@@ -56,6 +56,38 @@ class Settings:
         List of roles that have full access to the /admin command
     admin_role_ids: list[int]
         List of roles that have partial access to the /admin command (only blacklist and guilds)
+    card_cache_size: int
+        Maximum size in megabytes of the in-memory cache of rendered cards, 0 to disable
+    card_cache_directory: str | None
+        Directory where rendered cards are also cached on disk, disabled if `None`
+    card_disk_cache_size: int
+        Maximum size in megabytes of the cards cached on disk, 0 for no limit
+    card_layer_cache_size: int
+        Number of pre-drawn static card layers (one per ball and background) kept in memory
+    asset_cache_size: int
+        Maximum size in megabytes of the images kept in memory by each process, 0 to disable
+    render_workers: int | None
+        Number of processes drawing cards, 2 if `None`, in a thread if 0
+    render_queue_size: int
+        Maximum number of cards being drawn at the same time
+    card_profile: str
+        Name of the output profile used for detailed card views
+    card_preview_profile: str
+        Name of the output profile used for list views and previews
+    card_profiles: dict[str, dict[str, Any]]
+        Output profiles defined or overridden in the configuration file
+    guild_config_ttl: int
+        Seconds after which a cached server configuration is reloaded in the background, 0 to
+        only reload them when they are edited through the bot
+    catch_events_store: bool
+        Whether every catch is also stored in the `catchevent` table
+    catch_events_interval: int
+        Seconds between two flushes of the buffered catches to the metrics and the database
+    catch_events_buffer_size: int
+        Maximum number of catches buffered between two flushes
+    autocomplete_deadline: float
+        Seconds after an autocompletion request was received past which the results found so
+        far are returned
     """
 
     bot_token: str = ""
@@ -94,6 +126,29 @@ class Settings:
     prometheus_host: str = "0.0.0.0"
     prometheus_port: int = 15260
 
+    # rendered cards cache
+    card_cache_size: int = 128
+    card_cache_directory: str | None = None
+    card_disk_cache_size: int = 1024
+    card_layer_cache_size: int = 16
+    asset_cache_size: int = 128
+
+    # card rendering processes
+    render_workers: int | None = None
+    render_queue_size: int = 64
+    card_profile: str = "full"
+    card_preview_profile: str = "preview"
+    card_profiles: dict[str, dict[str, Any]] = field(default_factory=dict)
+
+    guild_config_ttl: int = 0
+
+    # catch metrics and analytics
+    catch_events_store: bool = False
+    catch_events_interval: int = 30
+    catch_events_buffer_size: int = 10000
+
+    autocomplete_deadline: float = 2.5
+
 
 settings = Settings()
 
@@ -131,6 +186,24 @@ def read_settings(path: "Path"):
     settings.prometheus_host = content["prometheus"]["host"]
     settings.prometheus_port = content["prometheus"]["port"]
 
+    settings.card_cache_size = content.get("card-cache", {}).get("memory-size", 128)
+    settings.card_cache_directory = content.get("card-cache", {}).get("directory")
+    settings.card_disk_cache_size = content.get("card-cache", {}).get("disk-size", 1024)
+    settings.card_layer_cache_size = content.get("card-cache", {}).get("layers", 16)
+    settings.asset_cache_size = content.get("card-cache", {}).get("assets-memory-size", 128)
+    settings.render_workers = content.get("card-rendering", {}).get("workers")
+    settings.render_queue_size = content.get("card-rendering", {}).get("queue-size", 64)
+    settings.card_profile = content.get("card-rendering", {}).get("profile") or "full"
+    settings.card_preview_profile = (
+        content.get("card-rendering", {}).get("preview-profile") or "preview"
+    )
+    settings.card_profiles = content.get("card-rendering", {}).get("profiles") or {}
+    settings.guild_config_ttl = content.get("guild-config-ttl") or 0
+    settings.catch_events_store = content.get("catch-events", {}).get("store", False)
+    settings.catch_events_interval = content.get("catch-events", {}).get("flush-interval", 30)
+    settings.catch_events_buffer_size = content.get("catch-events", {}).get("buffer-size", 10000)
+    settings.autocomplete_deadline = content.get("autocomplete-deadline") or 2.5
+
     settings.max_favorites = content.get("max-favorites", 50)
     settings.max_attack_bonus = content.get("max-attack-bonus", 20)
     settings.max_health_bonus = content.get("max-health-bonus", 20)
@@ -224,6 +297,70 @@ prometheus:
   enabled: false
   host: "0.0.0.0"
   port: 15260
+
+# rendered cards are cached to avoid drawing the same card multiple times
+card-cache:
+  # maximum size in megabytes of the in-memory cache, 0 to disable
+  memory-size: 128
+
+  # optional directory where rendered cards are also stored, leave empty to disable
+  directory:
+
+  # maximum size in megabytes of the cards stored in the directory, the least recently used
+  # are deleted first, 0 for no limit
+  disk-size: 1024
+
+  # number of static card layers (one per ball and background) kept in memory
+  # each layer uses about 12MB, only the stats are drawn on top of them
+  layers: 16
+
+  # maximum size in megabytes of the source images (backgrounds, artworks, spawn images) kept
+  # in memory by each rendering process, 0 to disable
+  assets-memory-size: 128
+
+# cards are drawn in separate processes to use multiple CPU cores
+card-rendering:
+  # number of processes drawing cards, 2 if empty, at most one per CPU core is useful
+  # each process keeps its own copy of the assets and layers caches above, so the memory used
+  # by the caches grows with this number. Set to 0 to draw cards in a thread of the bot instead
+  workers:
+
+  # maximum number of cards being drawn at the same time, other requests wait their turn
+  queue-size: 64
+
+  # output profile of detailed card views (/balls info) and of list views and previews
+  # built-in profiles: full (lossless PNG), webp, jpeg, preview (downscaled WebP)
+  profile: full
+  preview-profile: preview
+
+  # define new profiles or override the built-in ones, for example:
+  # profiles:
+  #   preview:
+  #     format: webp  # png, webp or jpeg
+  #     quality: 80
+  #     lossless: false
+  #     scale: 0.5  # downscale the card
+  #     effort: 2  # encoder speed/size trade-off, higher is slower and smaller
+  #     max-bytes: 153600  # lower the quality until the card fits
+
+# server configurations are kept in memory, edits made through the bot are applied immediately
+# set a number of seconds to also reload them periodically (edits from the admin panel)
+guild-config-ttl: 0
+
+# caught countryballs are buffered and counted in batches in the metrics
+catch-events:
+  # also store every catch in the catchevent table, for analytics
+  store: false
+
+  # seconds between two flushes of the buffered catches
+  flush-interval: 30
+
+  # maximum number of buffered catches, the oldest are dropped past this
+  buffer-size: 10000
+
+# Discord ignores autocompletion results sent more than 3 seconds after the request
+# past this number of seconds after receiving it, the results found so far are sent
+autocomplete-deadline: 2.5
   """  # noqa: W291
     )
 
@@ -237,6 +374,11 @@ def update_settings(path: "Path"):
     add_max_attack = "max-attack-bonus" not in content
     add_max_health = "max-health-bonus" not in content
     add_plural_collectible = "plural-collectible-name" not in content
+    add_card_cache = "card-cache:" not in content
+    add_card_rendering = "card-rendering:" not in content
+    add_guild_config_ttl = "guild-config-ttl:" not in content
+    add_catch_events = "catch-events:" not in content
+    add_autocomplete_deadline = "autocomplete-deadline:" not in content
 
     for line in content.splitlines():
         if line.startswith("owners:"):
@@ -285,5 +427,94 @@ max-health-bonus: 20
 plural-collectible-name: countryballs
 """
 
-    if any((add_owners, add_config_ref)):
+    if add_card_cache:
+        content += """
+# rendered cards are cached to avoid drawing the same card multiple times
+card-cache:
+  # maximum size in megabytes of the in-memory cache, 0 to disable
+  memory-size: 128
+
+  # optional directory where rendered cards are also stored, leave empty to disable
+  directory:
+
+  # maximum size in megabytes of the cards stored in the directory, the least recently used
+  # are deleted first, 0 for no limit
+  disk-size: 1024
+
+  # number of static card layers (one per ball and background) kept in memory
+  # each layer uses about 12MB, only the stats are drawn on top of them
+  layers: 16
+
+  # maximum size in megabytes of the source images (backgrounds, artworks, spawn images) kept
+  # in memory by each rendering process, 0 to disable
+  assets-memory-size: 128
+"""
+
+    if add_card_rendering:
+        content += """
+# cards are drawn in separate processes to use multiple CPU cores
+card-rendering:
+  # number of processes drawing cards, 2 if empty, at most one per CPU core is useful
+  # each process keeps its own copy of the assets and layers caches above, so the memory used
+  # by the caches grows with this number. Set to 0 to draw cards in a thread of the bot instead
+  workers:
+
+  # maximum number of cards being drawn at the same time, other requests wait their turn
+  queue-size: 64
+
+  # output profile of detailed card views (/balls info) and of list views and previews
+  # built-in profiles: full (lossless PNG), webp, jpeg, preview (downscaled WebP)
+  profile: full
+  preview-profile: preview
+
+  # define new profiles or override the built-in ones, for example:
+  # profiles:
+  #   preview:
+  #     format: webp  # png, webp or jpeg
+  #     quality: 80
+  #     lossless: false
+  #     scale: 0.5  # downscale the card
+  #     effort: 2  # encoder speed/size trade-off, higher is slower and smaller
+  #     max-bytes: 153600  # lower the quality until the card fits
+"""
+
+    if add_guild_config_ttl:
+        content += """
+# server configurations are kept in memory, edits made through the bot are applied immediately
+# set a number of seconds to also reload them periodically (edits from the admin panel)
+guild-config-ttl: 0
+"""
+
+    if add_catch_events:
+        content += """
+# caught countryballs are buffered and counted in batches in the metrics
+catch-events:
+  # also store every catch in the catchevent table, for analytics
+  store: false
+
+  # seconds between two flushes of the buffered catches
+  flush-interval: 30
+
+  # maximum number of buffered catches, the oldest are dropped past this
+  buffer-size: 10000
+"""
+
+    if add_autocomplete_deadline:
+        content += """
+# Discord ignores autocompletion results sent more than 3 seconds after the request
+# past this number of seconds after receiving it, the results found so far are sent
+autocomplete-deadline: 2.5
+"""
+
+    if any(
+        (
+            add_owners,
+            add_config_ref,
+            add_card_cache,
+            add_card_rendering,
+            add_guild_config_ttl,
+            add_catch_events,
+            add_autocomplete_deadline,
+        )
+    ):
         path.write_text(content)
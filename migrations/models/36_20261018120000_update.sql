@@ -0,0 +1,17 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "spawnstate" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "guild_id" BIGINT NOT NULL UNIQUE,
+    "amount" DOUBLE PRECISION NOT NULL,
+    "chance" INT NOT NULL,
+    "time" TIMESTAMPTZ NOT NULL,
+    "chatters" JSONB NOT NULL,
+    "updated_at" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP
+);
+COMMENT ON COLUMN "spawnstate"."guild_id" IS 'Discord guild ID';
+COMMENT ON COLUMN "spawnstate"."amount" IS 'Spawn progress of the guild';
+COMMENT ON COLUMN "spawnstate"."chance" IS 'Progress to reach before the next spawn';
+COMMENT ON COLUMN "spawnstate"."time" IS 'Time of the last spawn or of the first message';
+COMMENT ON COLUMN "spawnstate"."chatters" IS 'Statistics of the recent messages';
+-- downgrade --
+DROP TABLE IF EXISTS "spawnstate";
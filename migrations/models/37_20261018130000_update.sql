@@ -0,0 +1,20 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "catchevent" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "ball_id" INT NOT NULL,
+    "player_id" BIGINT NOT NULL,
+    "guild_id" BIGINT,
+    "shiny" BOOL NOT NULL  DEFAULT False,
+    "special_id" INT,
+    "guild_size" INT,
+    "spawned_at" TIMESTAMPTZ,
+    "caught_at" TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX IF NOT EXISTS "idx_catchevent_caught__c54cda" ON "catchevent" ("caught_at");
+COMMENT ON COLUMN "catchevent"."ball_id" IS 'ID of the caught ball';
+COMMENT ON COLUMN "catchevent"."player_id" IS 'Discord user ID of the player';
+COMMENT ON COLUMN "catchevent"."guild_id" IS 'Discord guild ID';
+COMMENT ON COLUMN "catchevent"."special_id" IS 'ID of the special event';
+COMMENT ON COLUMN "catchevent"."guild_size" IS 'Member count of the guild';
+-- downgrade --
+DROP TABLE IF EXISTS "catchevent";
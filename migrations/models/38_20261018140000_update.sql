@@ -0,0 +1,10 @@
+-- upgrade --
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+ALTER TABLE "ball" ADD "search_text" TEXT GENERATED ALWAYS AS (
+    lower("country" || ' ' || coalesce("catch_names", '') || ' ' || coalesce("translations", ''))
+) STORED;
+CREATE INDEX IF NOT EXISTS "idx_ball_search_trgm" ON "ball" USING GIN ("search_text" gin_trgm_ops);
+COMMENT ON COLUMN "ball"."search_text" IS 'Names searched by autocompletion, generated by the database';
+-- downgrade --
+DROP INDEX IF EXISTS "idx_ball_search_trgm";
+ALTER TABLE "ball" DROP COLUMN IF EXISTS "search_text";
@@ -0,0 +1,105 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "playerstats" (
+    "total" INT NOT NULL  DEFAULT 0,
+    "shiny" INT NOT NULL  DEFAULT 0,
+    "special" INT NOT NULL  DEFAULT 0,
+    "distinct_balls" INT NOT NULL  DEFAULT 0,
+    "player_id" INT NOT NULL  PRIMARY KEY REFERENCES "player" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_playerstats_total_8feea4" ON "playerstats" ("total");
+CREATE INDEX IF NOT EXISTS "idx_playerstats_shiny_bb6db3" ON "playerstats" ("shiny");
+CREATE INDEX IF NOT EXISTS "idx_ballinstanc_player__0a7386" ON "ballinstance" ("player_id", "ball_id");
+COMMENT ON COLUMN "playerstats"."total" IS 'Number of instances';
+COMMENT ON COLUMN "playerstats"."shiny" IS 'Number of shiny instances';
+COMMENT ON COLUMN "playerstats"."special" IS 'Number of instances with a special';
+COMMENT ON COLUMN "playerstats"."distinct_balls" IS 'Number of different balls';
+COMMENT ON TABLE "playerstats" IS 'Counters of the instances owned by a player, maintained by the database';
+-- statement-level triggers: a statement touching several rows (bulk inserts, deleting all the
+-- instances of a player) is counted once, with the rows it changed in the transition tables
+-- an update is counted as the removal of the old row followed by the addition of the new one
+CREATE OR REPLACE FUNCTION "update_playerstats"() RETURNS TRIGGER AS $$
+DECLARE
+    -- the changed rows, one array per column, with -1 for a removed row and 1 for an added one
+    player_ids INT[];
+    ball_ids INT[];
+    shinies INT[];
+    specials INT[];
+    signs INT[];
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        -- only the rows whose counted columns changed
+        SELECT array_agg(c."player_id"), array_agg(c."ball_id"), array_agg(c."shiny"),
+            array_agg(c."special"), array_agg(c."sign")
+        INTO player_ids, ball_ids, shinies, specials, signs
+        FROM old_rows o
+        JOIN new_rows n ON n."id" = o."id"
+        CROSS JOIN LATERAL (VALUES
+            (o."player_id", o."ball_id", o."shiny"::INT, (o."special_id" IS NOT NULL)::INT, -1),
+            (n."player_id", n."ball_id", n."shiny"::INT, (n."special_id" IS NOT NULL)::INT, 1)
+        ) AS c ("player_id", "ball_id", "shiny", "special", "sign")
+        WHERE (o."player_id", o."ball_id", o."shiny", o."special_id")
+            IS DISTINCT FROM (n."player_id", n."ball_id", n."shiny", n."special_id");
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg("player_id"), array_agg("ball_id"), array_agg("shiny"::INT),
+            array_agg(("special_id" IS NOT NULL)::INT), array_agg(-1)
+        INTO player_ids, ball_ids, shinies, specials, signs
+        FROM old_rows;
+    ELSE
+        SELECT array_agg("player_id"), array_agg("ball_id"), array_agg("shiny"::INT),
+            array_agg(("special_id" IS NOT NULL)::INT), array_agg(1)
+        INTO player_ids, ball_ids, shinies, specials, signs
+        FROM new_rows;
+    END IF;
+    IF player_ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+    -- the instances left of each changed (player, ball) pair, minus the change, tell if the
+    -- player owned the ball before and after the statement, counted with the
+    -- (player_id, ball_id) index; deleted players are skipped, their counters go with them
+    WITH pairs AS (
+        SELECT "player_id", "ball_id", SUM("sign") AS "total", SUM("sign" * "shiny") AS "shiny",
+            SUM("sign" * "special") AS "special"
+        FROM unnest(player_ids, ball_ids, shinies, specials, signs)
+            AS c ("player_id", "ball_id", "shiny", "special", "sign")
+        GROUP BY "player_id", "ball_id"
+    )
+    INSERT INTO "playerstats" AS s ("player_id", "total", "shiny", "special", "distinct_balls")
+    SELECT p."player_id", SUM(p."total"), SUM(p."shiny"), SUM(p."special"),
+        SUM((b."count" > 0)::INT - (b."count" - p."total" > 0)::INT)
+    FROM pairs p
+    CROSS JOIN LATERAL (
+        SELECT COUNT(*) AS "count" FROM "ballinstance"
+        WHERE "player_id" = p."player_id" AND "ball_id" = p."ball_id"
+    ) b
+    WHERE EXISTS (SELECT 1 FROM "player" WHERE "id" = p."player_id")
+    GROUP BY p."player_id"
+    ON CONFLICT ("player_id") DO UPDATE SET
+        "total" = s."total" + EXCLUDED."total",
+        "shiny" = s."shiny" + EXCLUDED."shiny",
+        "special" = s."special" + EXCLUDED."special",
+        "distinct_balls" = s."distinct_balls" + EXCLUDED."distinct_balls";
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+-- transition tables cannot be used with several events or a column list, hence one per event
+CREATE TRIGGER "ballinstance_playerstats_insert"
+    AFTER INSERT ON "ballinstance" REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION "update_playerstats"();
+CREATE TRIGGER "ballinstance_playerstats_delete"
+    AFTER DELETE ON "ballinstance" REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION "update_playerstats"();
+CREATE TRIGGER "ballinstance_playerstats_update"
+    AFTER UPDATE ON "ballinstance" REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION "update_playerstats"();
+INSERT INTO "playerstats" ("player_id", "total", "shiny", "special", "distinct_balls")
+    SELECT "player_id", COUNT(*), COUNT(*) FILTER (WHERE "shiny"), COUNT("special_id"),
+        COUNT(DISTINCT "ball_id")
+    FROM "ballinstance" GROUP BY "player_id"
+ON CONFLICT ("player_id") DO NOTHING;
+-- downgrade --
+DROP TRIGGER IF EXISTS "ballinstance_playerstats_insert" ON "ballinstance";
+DROP TRIGGER IF EXISTS "ballinstance_playerstats_delete" ON "ballinstance";
+DROP TRIGGER IF EXISTS "ballinstance_playerstats_update" ON "ballinstance";
+DROP FUNCTION IF EXISTS "update_playerstats";
+DROP INDEX IF EXISTS "idx_ballinstanc_player__0a7386";
+DROP TABLE IF EXISTS "playerstats";
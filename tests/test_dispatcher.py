@@ -0,0 +1,56 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+
+from ballsdex.packages.countryballs.dispatcher import SpawnDispatcher
+
+
+def make_channel(channel_id: int):
+    permissions = SimpleNamespace(attach_files=True, send_messages=True)
+    return SimpleNamespace(
+        id=channel_id,
+        guild=SimpleNamespace(me=None),
+        permissions_for=lambda member: permissions,
+    )
+
+
+class FailingBall:
+    """
+    A ball whose uploads are always rate-limited, asking to wait `retry_after` seconds.
+    """
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        self.attempts = 0
+
+    async def send(self, channel):
+        self.attempts += 1
+        response = SimpleNamespace(
+            status=429, reason="Too Many Requests", headers={"Retry-After": str(self.retry_after)}
+        )
+        raise discord.HTTPException(response, "rate limited")  # type: ignore
+
+
+class Ball:
+    async def send(self, channel):
+        await asyncio.sleep(0.01)
+
+
+def test_failing_channel_does_not_stall_others():
+    async def run():
+        dispatcher = SpawnDispatcher(max_concurrency=1, max_retries=3)
+        failing = FailingBall(retry_after=5)
+        try:
+            failed = dispatcher.submit(failing, make_channel(1))  # type: ignore
+            while failing.attempts == 0:
+                await asyncio.sleep(0.01)
+
+            # the only slot is free while the first channel waits before retrying
+            sent = dispatcher.submit(Ball(), make_channel(2))  # type: ignore
+            assert await asyncio.wait_for(sent, timeout=1) is True
+            assert not failed.done()
+        finally:
+            dispatcher.close()
+
+    asyncio.run(run())
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+from collections import Counter
+
+import pytest
+
+from ballsdex.core.image_generator import renderer as renderer_module
+from ballsdex.core.image_generator.benchmark import build_fixtures
+from ballsdex.core.image_generator.cache import card_cache, card_cache_key
+from ballsdex.core.image_generator.image_gen import CardSpec
+from ballsdex.core.image_generator.renderer import CardRenderer
+
+
+@pytest.fixture
+def chunks(monkeypatch):
+    """
+    Replace the drawing with a fake one, returning the list of chunks drawn.
+    """
+    drawn: list[list[CardSpec]] = []
+    lock = threading.Lock()
+
+    def encode_cards(specs, profile):
+        with lock:
+            drawn.append(specs)
+        return [repr(spec).encode() for spec in specs]
+
+    monkeypatch.setattr(renderer_module, "encode_cards", encode_cards)
+    return drawn
+
+
+@pytest.fixture
+def instances():
+    fixtures = build_fixtures(6)
+    return fixtures["regular"] + fixtures["shiny"] + fixtures["long"]
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+def test_render_many_groups_and_deduplicates(chunks, instances):
+    renderer = CardRenderer(workers=0)
+    requested = instances + instances[:3]
+    results = asyncio.run(collect(renderer.render_many(requested, chunk_size=2)))
+
+    # every instance is yielded with its own card, duplicates included
+    assert Counter(id(x) for x, _ in results) == Counter(id(x) for x in requested)
+    for instance, buffer in results:
+        assert buffer.read() == repr(CardSpec.from_instance(instance)).encode()
+
+    # identical cards are drawn once, in chunks sharing the same base layer
+    drawn = [spec for chunk in chunks for spec in chunk]
+    assert len(drawn) == len(set(drawn)) == len({CardSpec.from_instance(x) for x in instances})
+    for chunk in chunks:
+        assert 1 <= len(chunk) <= 2
+        assert len({spec.base_key for spec in chunk}) == 1
+
+
+def test_render_many_yields_cached_cards_first(chunks, instances):
+    renderer = CardRenderer(workers=0)
+    cached = instances[-1]
+    card_cache.configure(1024 * 1024)
+    try:
+        card_cache.set(
+            card_cache_key(CardSpec.from_instance(cached), renderer.default_profile), b"x"
+        )
+        results = asyncio.run(collect(renderer.render_many(instances)))
+    finally:
+        card_cache.configure(0)
+
+    assert results[0][0] is cached
+    assert results[0][1].read() == b"x"
+    assert len(results) == len(instances)
+
+
+def test_render_many_cancels_on_close(chunks, instances):
+    async def run():
+        # a single render at a time, the other chunks wait for a slot
+        renderer = CardRenderer(workers=0, queue_size=1)
+        iterator = renderer.render_many(instances, chunk_size=1)
+        await anext(iterator)
+        await iterator.aclose()
+        await asyncio.sleep(0.1)
+        return renderer
+
+    renderer = asyncio.run(run())
+    assert len(chunks) < len({CardSpec.from_instance(x) for x in instances})
+    assert renderer.pending == 0
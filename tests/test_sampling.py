@@ -0,0 +1,42 @@
+import random
+from collections import Counter
+
+import pytest
+
+from ballsdex.core.utils.sampling import AliasSampler
+
+# rarities as configured in the admin panel, including a disabled one
+RARITIES = {"common": 30, "uncommon": 10, "rare": 5, "epic": 2, "legendary": 0.5, "disabled": 0}
+DRAWS = 200_000
+# chi-square critical value for 4 degrees of freedom at p = 0.001
+CRITICAL_VALUE = 18.467
+
+
+def test_sample_many_follows_weights():
+    sampler = AliasSampler(list(RARITIES), list(RARITIES.values()))
+    counts = Counter(sampler.sample_many(DRAWS, random.Random(1234)))
+
+    assert counts["disabled"] == 0
+    total = sum(RARITIES.values())
+    chi_square = sum(
+        (counts[name] - DRAWS * weight / total) ** 2 / (DRAWS * weight / total)
+        for name, weight in RARITIES.items()
+        if weight > 0
+    )
+    assert chi_square < CRITICAL_VALUE
+
+
+def test_sample_many_is_reproducible():
+    sampler = AliasSampler(list(RARITIES), list(RARITIES.values()))
+    assert sampler.sample_many(100, random.Random(42)) == sampler.sample_many(
+        100, random.Random(42)
+    )
+
+
+@pytest.mark.parametrize(
+    "population, weights",
+    [([], []), (["a"], [1, 2]), (["a", "b"], [1, -1]), (["a", "b"], [0, 0])],
+)
+def test_invalid_weights(population, weights):
+    with pytest.raises(ValueError):
+        AliasSampler(population, weights)